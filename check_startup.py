@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+import time
+
+# ---------------------------------------------------------
+# Startup regression check: the CLI and every pipeline
+# module must import without pulling in a heavy dependency,
+# and a light command must start within the budget.
+#   python check_startup.py
+# ---------------------------------------------------------
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", "1.0"))  # seconds
+HEAVY_MODULES = ["whisper", "torch", "faster_whisper", "googleapiclient", "edge_tts", "requests"]
+LIGHT_MODULES = ["cli", "main", "worker", "stages", "make_videos", "render_scheduler", "uploader"]
+
+
+def leaked_imports():
+    code = (
+        "import sys\n"
+        f"for name in {LIGHT_MODULES!r}: __import__(name)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout.strip()
+    return [m for m in out.split(",") if m]
+
+
+def startup_time(argv, runs=3):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *argv], capture_output=True, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    failures = []
+
+    leaked = leaked_imports()
+    if leaked:
+        failures.append(f"heavy modules imported at startup: {', '.join(leaked)}")
+
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+    seconds = startup_time([cli, "--help"])
+    print(f"⏱️ cli.py --help: {seconds:.2f}s (budget {STARTUP_BUDGET:.2f}s)")
+    if seconds > STARTUP_BUDGET:
+        failures.append(f"startup took {seconds:.2f}s")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Startup check passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import os
+import asyncio
+import argparse
+from datetime import date, timedelta
+import work_queue
+from content_store import RUN_DATE, get_item, iter_items
+from manifest import RunManifest
+from pipeline import PREPARE_CONCURRENCY
+from stages import (
+    RENDER_PREVIEW, cleanup_item, fetch_item, has_content, item_paths,
+    publish_times, record_render, render_job, tts_item, upload_item
+)
+
+# ---------------------------------------------------------
+# One command per stage, each loading only what it needs:
+#   python cli.py schedule --start 2026-02-04 --days 7
+#   python cli.py render --id 2026-02-04-15a5e073
+#   python cli.py upload --dry-run
+#   python cli.py requeue --id 2026-02-04-15a5e073
+# Whisper/torch, edge_tts, requests and googleapiclient are imported
+# inside the stage that uses them (see check_startup.py).
+# ---------------------------------------------------------
+
+
+def select_items(args):
+    if args.id:
+        items = [get_item(item_id) for item_id in args.id]
+        missing = [item_id for item_id, item in zip(args.id, items) if item is None]
+        if missing:
+            raise SystemExit(f"Unknown content IDs: {', '.join(missing)}")
+        return items
+
+    end = (date.fromisoformat(args.start) + timedelta(days=args.days - 1)).isoformat()
+    return [item for item in iter_items(args.start, end) if has_content(item)]
+
+
+async def _each(items, func, limit=PREPARE_CONCURRENCY):
+    semaphore = asyncio.Semaphore(limit)
+    failed = 0
+
+    async def one(item):
+        nonlocal failed
+        async with semaphore:
+            try:
+                await func(item)
+            except Exception as e:
+                failed += 1
+                print(f"❌ {item['id']}: {str(e) or type(e).__name__}")
+
+    await asyncio.gather(*(one(item) for item in items))
+    return failed
+
+
+# ---------------------------------------------------------
+# Subcommands
+# ---------------------------------------------------------
+def cmd_ingest(args):
+    items = select_items(args)
+    added = work_queue.enqueue(items)
+    for item in items:
+        print(f"{item['id']}  {item['date']}  {item['title']}")
+    print(f"{len(items)} items, {added} newly queued ({work_queue.counts()})")
+
+
+def cmd_tts(args):
+    manifest = RunManifest()
+    return asyncio.run(_each(select_items(args), lambda item: tts_item(item, manifest)))
+
+
+def cmd_fetch(args):
+    manifest = RunManifest()
+    return asyncio.run(_each(select_items(args), lambda item: fetch_item(item, manifest)))
+
+
+def cmd_subtitles(args):
+    from make_videos import generate_ass_subtitles
+    from subtitles import write_ass_subtitles
+    from tts_cache import get_transcript
+
+    failed = 0
+    for item in select_items(args):
+        paths = item_paths(item["id"])
+        cached_words = get_transcript(paths["audio"]) if os.path.exists(paths["audio"]) else None
+        if cached_words is not None:
+            print(f"♻️ Whisper transcript cache hit for {item['id']}")
+            write_ass_subtitles(cached_words, paths["subtitles"])
+        elif not asyncio.run(generate_ass_subtitles(paths["audio"], paths["subtitles"])):
+            failed += 1
+    return failed
+
+
+def cmd_render(args):
+    from render_scheduler import render_batch
+
+    manifest = RunManifest()
+    # After a reviewed draft, a plain render promotes the same plan:
+    # clips and subtitles are already on disk, nothing is refetched
+    jobs = [
+        render_job(item["id"], draft=args.draft, preview=args.preview or RENDER_PREVIEW)
+        for item in select_items(args)
+    ]
+
+    options = {"segmented": True} if args.segmented else {}
+    results = render_batch(jobs, args.workers, **options)
+
+    for job, result in zip(jobs, results):
+        if result["ok"]:
+            record_render(manifest, job)
+    return sum(not r["ok"] for r in results)
+
+
+def cmd_upload(args):
+    items = select_items(args)
+    times = publish_times(items)
+
+    if args.dry_run:
+        for item in items:
+            video = item_paths(item["id"])["final"]
+            state = "ready" if os.path.exists(video) else "missing"
+            print(f"{times[item['id']]}  {video} ({state})  {item['title']}")
+        return 0
+
+    from uploader import QuotaExceeded, UploadEngine
+
+    manifest = RunManifest()
+    uploader = UploadEngine()
+    failed = 0
+
+    for item in items:
+        if manifest.done(item["id"], "upload"):
+            print(f"Skipping ID {item['id']} (already uploaded)")
+            continue
+        # Spent quota is not a failure: the rest waits for the next day
+        if not uploader.quota.affordable():
+            print(f"⏸️ Quota spent, ID {item['id']} deferred")
+            work_queue.mark_deferred(item["id"], "upload", "YouTube quota spent")
+            continue
+        try:
+            video_id = upload_item(uploader, item, manifest, times[item["id"]])
+        except QuotaExceeded as e:
+            print(f"⏸️ ID {item['id']} deferred: {e}")
+            work_queue.mark_deferred(item["id"], "upload", str(e))
+            continue
+        except Exception as e:
+            failed += 1
+            print(f"❌ Upload failed for ID {item['id']}: {e}")
+            continue
+        work_queue.mark_done(item["id"], video_id)
+        cleanup_item(item["id"])
+
+    print(f"YouTube API: {uploader.quota.summary()}")
+    return failed
+
+
+def cmd_requeue(args):
+    # Only failed items: no --id means every one of them, whatever its date
+    requeued = sum(work_queue.requeue(item_id) for item_id in args.id or [None])
+    print(f"{requeued} failed items requeued ({work_queue.counts()})")
+
+
+def cmd_schedule(args):
+    items = select_items(args)
+    times = publish_times(items)
+    for item in items:
+        print(f"{times[item['id']]}  {item['id']}  {item['title']}")
+
+
+COMMANDS = {
+    "ingest": (cmd_ingest, "Index input.csv and queue the items"),
+    "tts": (cmd_tts, "Narration and subtitles (edge-tts)"),
+    "fetch": (cmd_fetch, "Download and normalize background clips"),
+    "subtitles": (cmd_subtitles, "Re-time subtitles with Whisper"),
+    "render": (cmd_render, "Render final videos (or --draft previews)"),
+    "upload": (cmd_upload, "Upload rendered videos to YouTube"),
+    "schedule": (cmd_schedule, "Show each item's publishAt slot"),
+    "requeue": (cmd_requeue, "Give failed queue items a fresh set of attempts"),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="wikiTube shorts, one stage at a time")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name, (_, help_text) in COMMANDS.items():
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--start", default=RUN_DATE, help="First content date (YYYY-MM-DD)")
+        cmd.add_argument("--days", type=int, default=1)
+        cmd.add_argument("--id", action="append", help="Content ID (repeatable); overrides the dates")
+
+        if name == "render":
+            cmd.add_argument("--segmented", action="store_true")
+            cmd.add_argument("--draft", action="store_true", help="540x960 review render")
+            cmd.add_argument("--preview", action="store_true", help="Also write a small preview")
+            cmd.add_argument("--workers", type=int, default=0)
+        if name == "upload":
+            cmd.add_argument("--dry-run", action="store_true")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    func = COMMANDS[args.command][0]
+    return 1 if func(args) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,226 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from helper import CACHE_DIR, file_sha256, link_into
+
+# On-disk cache of downloaded background clips, keyed by
+# (provider, provider video id, rendition) and shared across runs.
+CLIP_CACHE_DIR = os.getenv("CLIP_CACHE_DIR", os.path.join(CACHE_DIR, "clips"))
+CLIP_CACHE_MAX_BYTES = int(os.getenv("CLIP_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# Utility: index connection (one per call, thread safe)
+# ---------------------------------------------------------
+@contextmanager
+def _connect():
+    os.makedirs(CLIP_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(CLIP_CACHE_DIR, "index.db"), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS clips (
+            key        TEXT PRIMARY KEY,
+            provider   TEXT NOT NULL,
+            video_id   TEXT NOT NULL,
+            rendition  TEXT NOT NULL,
+            path       TEXT NOT NULL,
+            size       INTEGER NOT NULL,
+            sha256     TEXT NOT NULL,
+            duration   REAL,
+            last_used  REAL NOT NULL,
+            mtime      INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS clip_keywords (
+            keyword    TEXT NOT NULL,
+            key        TEXT NOT NULL,
+            PRIMARY KEY (keyword, key)
+        );
+        CREATE INDEX IF NOT EXISTS clips_lru ON clips (last_used);
+    """)
+    # Indexes created before mtime was recorded
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(clips)")}
+    if "mtime" not in columns:
+        conn.execute("ALTER TABLE clips ADD COLUMN mtime INTEGER")
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def clip_key(provider, video_id, rendition) -> str:
+    return f"{provider}/{video_id}/{rendition}"
+
+
+def _normalize_keyword(keyword: str) -> str:
+    return " ".join(keyword.lower().split())
+
+
+def _verify(conn, row) -> bool:
+    """
+    Integrity check against what was stored at insert time: size and
+    mtime from a stat, so lookups never re-read the clips. Entries from
+    before mtime was recorded are hashed once and then stamped.
+    Corrupt or missing entries are dropped from the index.
+    """
+    path = row["path"]
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+
+    if st is None or st.st_size != row["size"]:
+        ok = False
+    elif row["mtime"] is None:
+        ok = file_sha256(path) == row["sha256"]
+        if ok:
+            conn.execute("UPDATE clips SET mtime = ? WHERE key = ?", (st.st_mtime_ns, row["key"]))
+    else:
+        ok = st.st_mtime_ns == row["mtime"]
+
+    if not ok:
+        print(f"⚠️ Dropping corrupt cache entry {row['key']}")
+        _remove(conn, row)
+    return ok
+
+
+def _remove(conn, row):
+    conn.execute("DELETE FROM clips WHERE key = ?", (row["key"],))
+    conn.execute("DELETE FROM clip_keywords WHERE key = ?", (row["key"],))
+    if os.path.exists(row["path"]):
+        os.remove(row["path"])
+
+
+def _touch(conn, key):
+    conn.execute("UPDATE clips SET last_used = ? WHERE key = ?", (time.time(), key))
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+def get(provider, video_id, rendition):
+    """
+    Return the cached path for an exact clip, or None.
+    """
+    key = clip_key(provider, video_id, rendition)
+
+    with _lock, _connect() as conn:
+        row = conn.execute("SELECT * FROM clips WHERE key = ?", (key,)).fetchone()
+        if row is None or not _verify(conn, row):
+            return None
+        _touch(conn, key)
+        return row["path"]
+
+
+def lookup_keyword(keyword: str) -> list:
+    """
+    Cached clips previously downloaded for this keyword, as dicts with the
+    same fields as a provider search candidate plus "path".
+    """
+    with _lock, _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT c.* FROM clips c
+            JOIN clip_keywords k ON k.key = c.key
+            WHERE k.keyword = ?
+            """,
+            (_normalize_keyword(keyword),)
+        ).fetchall()
+
+        hits = []
+        for row in rows:
+            if not _verify(conn, row):
+                continue
+            width, height = (int(x) for x in row["rendition"].split("x"))
+            hits.append({
+                "provider": row["provider"],
+                "video_id": row["video_id"],
+                "duration": row["duration"],
+                "width": width,
+                "height": height,
+                "path": row["path"],
+                "key": row["key"],
+            })
+        return hits
+
+
+def mark_used(key: str):
+    with _lock, _connect() as conn:
+        _touch(conn, key)
+
+
+def put(candidate: dict, src_path: str, keyword: str = None):
+    """
+    Add a freshly downloaded clip (hard-linked, not copied) and
+    evict least recently used clips beyond CLIP_CACHE_MAX_BYTES.
+    Returns the cached path, or None for a clip larger than the whole
+    budget (it is never cached).
+    """
+    size = os.path.getsize(src_path)
+    if size > CLIP_CACHE_MAX_BYTES:
+        print(f"⚠️ Not caching {src_path}: {size} bytes is over the cache budget")
+        return None
+
+    rendition = f"{candidate['width']}x{candidate['height']}"
+    key = clip_key(candidate["provider"], candidate["video_id"], rendition)
+    path = os.path.join(
+        CLIP_CACHE_DIR,
+        candidate["provider"],
+        f"{candidate['video_id']}_{rendition}.mp4"
+    )
+
+    link_into(src_path, path)
+    st = os.stat(path)
+
+    with _lock, _connect() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO clips
+                (key, provider, video_id, rendition, path, size, sha256, duration, last_used, mtime)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                key,
+                candidate["provider"],
+                candidate["video_id"],
+                rendition,
+                path,
+                st.st_size,
+                file_sha256(path),
+                candidate.get("duration"),
+                time.time(),
+                st.st_mtime_ns,
+            )
+        )
+        if keyword:
+            conn.execute(
+                "INSERT OR IGNORE INTO clip_keywords VALUES (?, ?)",
+                (_normalize_keyword(keyword), key)
+            )
+        _evict(conn, keep=key)
+
+    return path
+
+
+def _evict(conn, keep=None):
+    """
+    Drop least recently used clips until the index fits the budget;
+    `keep` (the clip just added) is never evicted.
+    """
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM clips").fetchone()[0]
+    if total <= CLIP_CACHE_MAX_BYTES:
+        return
+
+    for row in conn.execute("SELECT * FROM clips ORDER BY last_used").fetchall():
+        if total <= CLIP_CACHE_MAX_BYTES:
+            break
+        if row["key"] == keep:
+            continue
+        _remove(conn, row)
+        total -= row["size"]
+        print(f"🧹 Evicted cached clip {row['key']}")
@@ -0,0 +1,192 @@
+import ast
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, TypedDict
+from helper import CACHE_DIR
+
+# Parsed input.csv, indexed by date and content ID. Rebuilt only when the
+# CSV's size or mtime changes.
+CONTENT_DB_PATH = os.getenv("CONTENT_DB_PATH", os.path.join(CACHE_DIR, "content.db"))
+# First content date a run works on (main.py, cli.py)
+RUN_DATE = os.getenv("RUN_DATE", "2026-02-04")  # or datetime.today().strftime('%Y-%m-%d')
+
+_lock = threading.Lock()
+
+
+class ContentItem(TypedDict):
+    id: str
+    date: str
+    title: str
+    content: str
+    description: str
+    keywords: List[str]
+    tags: List[str]
+    bg_vedios: List[str]
+
+
+# ---------------------------------------------------------
+# Utility: store connection (one per call, thread safe)
+# ---------------------------------------------------------
+@contextmanager
+def _connect():
+    dirname = os.path.dirname(CONTENT_DB_PATH)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    conn = sqlite3.connect(CONTENT_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS source (
+            path    TEXT PRIMARY KEY,
+            size    INTEGER NOT NULL,
+            mtime   INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            id          TEXT PRIMARY KEY,
+            date        TEXT NOT NULL,
+            row_num     INTEGER NOT NULL,
+            title       TEXT NOT NULL,
+            content     TEXT NOT NULL,
+            description TEXT NOT NULL,
+            keywords    TEXT NOT NULL,
+            tags        TEXT NOT NULL,
+            bg_vedios   TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS items_by_date ON items (date, row_num);
+    """)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def content_id(date: str, title: str, content: str) -> str:
+    """
+    Stable across reordering and unrelated edits of the CSV:
+    the date plus a hash of the item's own text.
+    """
+    digest = hashlib.sha1(f"{title}\n{content}".encode("utf-8")).hexdigest()[:8]
+    return f"{date}-{digest}"
+
+
+def _row_to_item(row) -> ContentItem:
+    return ContentItem(
+        id=row["id"],
+        date=row["date"],
+        title=row["title"],
+        content=row["content"],
+        description=row["description"],
+        keywords=json.loads(row["keywords"]),
+        tags=json.loads(row["tags"]),
+        bg_vedios=json.loads(row["bg_vedios"]),
+    )
+
+
+# ---------------------------------------------------------
+# Build: parse the CSV once into the store when it changed
+# ---------------------------------------------------------
+def parse_csv(csv_file='input.csv'):
+    """
+    Every row of the CSV, parsed: list columns become lists, values are
+    stripped. Yields (row number, row dict); the store below indexes them.
+    """
+    with open(csv_file, mode='r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        # Strip header spaces
+        reader.fieldnames = [h.strip() for h in reader.fieldnames]
+
+        for idx, row in enumerate(reader, start=1):
+            # Strip spaces from all values
+            row = {k: v.strip() if isinstance(v, str) else v for k, v in row.items()}
+
+            # Convert columns to list where needed
+            if row.get('bg_vedios'):
+                try:
+                    row['bg_vedios'] = list(ast.literal_eval("[" + row['bg_vedios'] + "]"))
+                except (ValueError, SyntaxError):
+                    row['bg_vedios'] = [
+                        k.strip().strip('"') for k in row['bg_vedios'].split(',') if k.strip()
+                    ]
+
+            if row.get('keywords'):
+                row['keywords'] = [k.strip() for k in row['keywords'].split(',')]
+
+            if row.get('tags'):
+                row['tags'] = [t.strip() for t in row['tags'].split()]
+
+            yield idx, row
+
+
+def _ensure_current(conn, csv_file):
+    path = os.path.abspath(csv_file)
+    st = os.stat(path)
+
+    source = conn.execute("SELECT path, size, mtime FROM source").fetchone()
+    if source is not None and tuple(source) == (path, st.st_size, st.st_mtime_ns):
+        return
+
+    conn.execute("DELETE FROM source")
+    conn.execute("DELETE FROM items")
+
+    seen = set()
+    for row_num, row in parse_csv(csv_file):
+        item_id = content_id(row.get('date', ''), row.get('title', ''), row.get('content', ''))
+        # Same text twice on one day: keep both, in CSV order
+        base, n = item_id, 1
+        while item_id in seen:
+            n += 1
+            item_id = f"{base}-{n}"
+        seen.add(item_id)
+
+        conn.execute(
+            "INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                item_id,
+                row.get('date', ''),
+                row_num,
+                row.get('title', ''),
+                row.get('content', ''),
+                row.get('description', ''),
+                json.dumps(row.get('keywords') or []),
+                json.dumps(row.get('tags') or []),
+                json.dumps(row.get('bg_vedios') or []),
+            )
+        )
+
+    conn.execute("INSERT INTO source VALUES (?, ?, ?)", (path, st.st_size, st.st_mtime_ns))
+    print(f"📇 Indexed {len(seen)} items from {csv_file}")
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+def iter_items(start_date, end_date=None, csv_file='input.csv') -> Iterator[ContentItem]:
+    """
+    Items dated in [start_date, end_date] (ISO strings; one day when
+    end_date is omitted), in date then CSV order.
+    """
+    end_date = end_date or start_date
+
+    with _lock, _connect() as conn:
+        _ensure_current(conn, csv_file)
+        rows = conn.execute(
+            "SELECT * FROM items WHERE date BETWEEN ? AND ? ORDER BY date, row_num",
+            (start_date, end_date)
+        ).fetchall()
+
+    for row in rows:
+        yield _row_to_item(row)
+
+
+def get_item(item_id: str, csv_file='input.csv') -> Optional[ContentItem]:
+    with _lock, _connect() as conn:
+        _ensure_current(conn, csv_file)
+        row = conn.execute("SELECT * FROM items WHERE id = ?", (item_id,)).fetchone()
+
+    return _row_to_item(row) if row else None
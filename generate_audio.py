@@ -1,22 +1,174 @@
-import edge_tts
 import asyncio
 import os
+import time
 import uuid
+from subtitles import write_ass_subtitles
+import tts_cache
+
+# edge-tts default output is "audio-24khz-48kbitrate-mono-mp3" (CBR),
+# so a chunk's duration follows directly from its byte count.
+MP3_BITRATE = 48_000
+TICKS_PER_SECOND = 10_000_000
+
+# Max chunks synthesized at once, across every content item
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+# Audio frames a chunk may buffer ahead of the writer
+TTS_BUFFER_FRAMES = int(os.getenv("TTS_BUFFER_FRAMES", "256"))
+MAX_RETRIES = 5
+
+
+# ---------------------------------------------------------
+# Adaptive token bucket (AIMD): speeds up while requests
+# succeed, halves its rate whenever the service throttles
+# ---------------------------------------------------------
+class AdaptiveTokenBucket:
+    def __init__(self, rate=2.0, capacity=4, min_rate=0.2, max_rate=8.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def on_throttle(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = 0
+
+
+_limiter = None
+_semaphore = None
+
+
+def _get_limits():
+    # Created lazily so they bind to the running event loop
+    global _limiter, _semaphore
+    if _limiter is None:
+        _limiter = AdaptiveTokenBucket()
+        _semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+    return _limiter, _semaphore
+
+
+def _is_throttled(error) -> bool:
+    status = getattr(error, "status", None)
+    return status in (429, 503) or "429" in str(error)
+
+
+# ---------------------------------------------------------
+# Synthesize one chunk → audio frames on a queue + words
+# ---------------------------------------------------------
+async def _synthesize_chunk(chunk, voice, frames):
+    """
+    Streams audio frames onto `frames` (a bounded queue) as they arrive and
+    ends with a None sentinel. A chunk ahead of the writer waits once its
+    queue is full, so at most TTS_BUFFER_FRAMES frames per chunk are held.
+    A cancelled chunk sends no sentinel: the writer is gone, and waiting on
+    its full queue would never end.
+    """
+    import edge_tts
+
+    limiter, semaphore = _get_limits()
+
+    # The slot is taken first and kept across retries: slots go out in
+    # chunk order, so the chunk the writer waits on always holds one
+    # even while later chunks sit on full queues
+    cancelled = False
+    try:
+        async with semaphore:
+            for attempt in range(MAX_RETRIES):
+                await limiter.acquire()
+
+                communicate = edge_tts.Communicate(
+                    chunk,
+                    voice,
+                    boundary="WordBoundary"
+                )
+
+                audio_bytes = 0
+                words_timing = []
+
+                try:
+                    async for message in communicate.stream():
+                        if message["type"] == "audio":
+                            await frames.put(message["data"])
+                            audio_bytes += len(message["data"])
+                        elif message["type"] == "WordBoundary":
+                            start = message["offset"] / TICKS_PER_SECOND
+                            words_timing.append({
+                                "word": message["text"],
+                                "start": start,
+                                "end": start + message["duration"] / TICKS_PER_SECOND
+                            })
+                except Exception as e:
+                    # Frames already handed to the writer can't be taken back
+                    if (
+                        not _is_throttled(e)
+                        or audio_bytes
+                        or attempt == MAX_RETRIES - 1
+                    ):
+                        raise
+                    limiter.on_throttle()
+                    print(f"⚠️ TTS throttled, backing off (rate {limiter.rate:.2f}/s)")
+                    continue
+
+                limiter.on_success()
+                return audio_bytes, words_timing
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        if not cancelled:
+            await frames.put(None)
+
 
 async def generate_audio(
     text,
     output_file,
     voice="en-US-JennyNeural",
-    chunk_size=500
+    chunk_size=500,
+    subtitle_file=None,
+    use_cache=True
 ):
     """
     Generate TTS audio from long text using Edge TTS.
-    Handles chunking, merging, and cleanup safely.
+    Chunks are synthesized concurrently and their frames are streamed,
+    in order, straight into the output file (no temp chunk files).
+    If `subtitle_file` is given, word timings from edge-tts WordBoundary
+    events are shifted across chunks and written there as ASS subtitles.
+    Results are cached by (normalized text, voice, chunk size) across runs.
     """
 
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
+    key = tts_cache.cache_key(text, voice, chunk_size)
+    if use_cache:
+        cached_words = tts_cache.get_audio(key, output_file)
+        if cached_words is not None:
+            print(f"♻️ Audio cache hit: {output_file}")
+            if subtitle_file:
+                write_ass_subtitles(cached_words, subtitle_file)
+            return output_file
+
     # Basic text cleaning
     text = text.replace("``", '"').replace("''", '"')
 
@@ -27,33 +179,53 @@ async def generate_audio(
         for i in range(0, len(words), chunk_size)
     ]
 
-    temp_files = []
-    unique_prefix = uuid.uuid4().hex[:8]
+    # Written next to the destination and renamed only once complete,
+    # so an interrupted run never leaves a truncated audio_{id}.mp3
+    part_file = f"{output_file}.{uuid.uuid4().hex[:8]}.part"
+    queues = [asyncio.Queue(maxsize=TTS_BUFFER_FRAMES) for _ in chunks]
+    tasks = [
+        asyncio.create_task(_synthesize_chunk(chunk, voice, frames))
+        for chunk, frames in zip(chunks, queues)
+    ]
 
     try:
-        # Generate audio chunks
-        for i, chunk in enumerate(chunks):
-            communicate = edge_tts.Communicate(chunk, voice)
+        # edge-tts emits raw CBR MP3 frames, so appending them back to back
+        # yields a valid stream whose duration ffprobe reads from the bitrate
+        with open(part_file, "wb") as outfile:
+            for frames in queues:
+                while (data := await frames.get()) is not None:
+                    outfile.write(data)
+
+        results = await asyncio.gather(*tasks)
+        os.replace(part_file, output_file)
 
-            temp_file = f"temp_{unique_prefix}_{i}.mp3"
-            await communicate.save(temp_file)
-            temp_files.append(temp_file)
+        print(f"✅ Audio created: {output_file}")
 
-            # Prevent rate-limiting
-            await asyncio.sleep(0.5)
+        # Offsets restart at 0 for every chunk
+        words_timing = []
+        chunk_start = 0.0
+        for audio_bytes, chunk_words in results:
+            for w in chunk_words:
+                words_timing.append({
+                    "word": w["word"],
+                    "start": chunk_start + w["start"],
+                    "end": chunk_start + w["end"]
+                })
+            chunk_start += audio_bytes * 8 / MP3_BITRATE
 
-        # Merge chunks into final audio
-        with open(output_file, "wb") as outfile:
-            for temp_file in temp_files:
-                with open(temp_file, "rb") as infile:
-                    outfile.write(infile.read())
+        if subtitle_file:
+            word_count = write_ass_subtitles(words_timing, subtitle_file)
+            print(f"✅ ASS subtitles created ({word_count} words): {subtitle_file}")
 
-        print(f"✅ Audio created: {output_file}")
+        if use_cache:
+            tts_cache.put_audio(key, output_file, words_timing)
 
     finally:
-        # Cleanup temp files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+        for task in tasks:
+            task.cancel()
+        # Never leave a chunk behind, even when this call was cancelled
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if os.path.exists(part_file):
+            os.remove(part_file)
 
     return output_file
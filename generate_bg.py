@@ -1,7 +1,20 @@
+import asyncio
+import hashlib
 import os
 import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
+import clip_cache
+from helper import Stopped, gather_all, link_into, run_in_thread
+from media_info import InvalidMedia, validate_clip
+import search_index
 
 # ────────────────────────────────
 # Load environment variables
@@ -18,28 +31,218 @@ MIN_DURATION = 10
 MAX_DURATION = 15
 MAX_WIDTH = 1080
 TIMEOUT = 30
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "6"))
+DOWNLOAD_ATTEMPTS = 3
+
+# "race" | "delayed" | "off" — see hedged_search()
+HEDGE_MODE = os.getenv("HEDGE_MODE", "race")
+HEDGE_PERCENTILE = 0.9
+HEDGE_DELAY_DEFAULT = 2.0
 
 
 # ────────────────────────────────
-# Utility: download file
+# Utility: pooled session per host
 # ────────────────────────────────
-def download_file(url: str, save_path: str):
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    One keep-alive session per host, shared by all fetch workers,
+    so TLS connections are reused across searches and downloads.
+    """
+    host = urlparse(url).netloc
+
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=FETCH_WORKERS,
+                max_retries=Retry(
+                    total=2,
+                    backoff_factor=0.5,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=("GET",)
+                )
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+# ────────────────────────────────
+# Utility: download file (resumable)
+# ────────────────────────────────
+def download_file(url: str, save_path: str, stop=None):
+    """
+    Stream `url` into `save_path` via a .part file. If a partial file is
+    left over (or the connection drops), the rest is requested with an
+    HTTP Range header instead of starting again from byte 0.
+    Setting `stop` (a threading.Event) ends it between chunks; the part
+    file stays for the next attempt.
+    """
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    # Keyed by URL so a leftover part of a different clip is never resumed
+    url_hash = hashlib.sha1(url.encode()).hexdigest()[:8]
+    part_path = f"{save_path}.{url_hash}.part"
+
+    for attempt in range(DOWNLOAD_ATTEMPTS):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        try:
+            with get_session(url).get(
+                url, headers=headers, stream=True, timeout=TIMEOUT
+            ) as r:
+                if r.status_code == 416:
+                    # Nothing left to fetch: the part file is already complete
+                    break
+                r.raise_for_status()
+
+                # 200 means the server ignored the Range header
+                mode = "ab" if r.status_code == 206 else "wb"
+                with open(part_path, mode) as f:
+                    for chunk in r.iter_content(chunk_size=1024 * 1024):
+                        if stop is not None and stop.is_set():
+                            raise Stopped(f"Download of {save_path} stopped")
+                        if chunk:
+                            f.write(chunk)
+            break
+        except (
+            requests.ConnectionError,
+            requests.exceptions.ChunkedEncodingError,
+            requests.Timeout
+        ):
+            if attempt == DOWNLOAD_ATTEMPTS - 1:
+                raise
+            print(f"⚠️ Download interrupted, resuming from byte {offset}")
+
+    os.replace(part_path, save_path)
+
+
+# ────────────────────────────────
+# Provider rate limits + latency stats
+# ────────────────────────────────
+_stats_lock = threading.Lock()
+_latencies = {"Pexels": deque(maxlen=50), "Pixabay": deque(maxlen=50)}
+_blocked_until = {"Pexels": 0.0, "Pixabay": 0.0}
+
+
+def _note_rate_limit(name: str, r: requests.Response, reset_is_epoch: bool):
+    """
+    Honour 429s and X-RateLimit-* headers: while a provider is out of
+    quota it is skipped instead of being asked (and failing) again.
+    Pexels sends the reset as a UNIX timestamp, Pixabay as seconds left.
+    """
+    now = time.time()
+    until = 0.0
+
+    if r.status_code == 429:
+        retry_after = r.headers.get("Retry-After")
+        until = now + (float(retry_after) if retry_after else 60)
+
+    remaining = r.headers.get("X-Ratelimit-Remaining")
+    reset = r.headers.get("X-Ratelimit-Reset")
+    if remaining is not None and reset is not None and int(remaining) <= 0:
+        until = max(until, float(reset) if reset_is_epoch else now + float(reset))
+
+    if until:
+        with _stats_lock:
+            _blocked_until[name] = max(_blocked_until[name], until)
+
+
+def _hedge_delay(name: str) -> float:
+    # p90 of recent search latencies; fixed default until enough samples
+    with _stats_lock:
+        samples = sorted(_latencies[name])
+    if len(samples) < 5:
+        return HEDGE_DELAY_DEFAULT
+    return samples[int(len(samples) * HEDGE_PERCENTILE) - 1]
 
-    with requests.get(url, stream=True, timeout=TIMEOUT) as r:
-        r.raise_for_status()
-        with open(save_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
+
+def _check_blocked(name: str):
+    with _stats_lock:
+        wait_s = _blocked_until[name] - time.time()
+    if wait_s > 0:
+        raise RuntimeError(f"{name} rate limited for another {wait_s:.0f}s")
+
+
+def _timed_search(name, search, keyword, taken=None):
+    start = time.monotonic()
+    try:
+        return search(keyword, taken)
+    finally:
+        with _stats_lock:
+            _latencies[name].append(time.monotonic() - start)
+
+
+# ────────────────────────────────
+# Candidate selection (local indexed query)
+# ────────────────────────────────
+_taken_lock = threading.Lock()
+
+
+def _is_taken(taken, provider, video_id) -> bool:
+    if taken is None:
+        return False
+    with _taken_lock:
+        return (provider, video_id) in taken
+
+
+def _claim(taken, provider, video_id) -> bool:
+    """
+    Reserve a clip in `taken` (the clips already used by one item);
+    False if another of the item's downloads has it.
+    """
+    if taken is None:
+        return True
+    with _taken_lock:
+        if (provider, video_id) in taken:
+            return False
+        taken.add((provider, video_id))
+        return True
+
+
+def _pick_candidate(provider: str, label: str, keyword: str, taken=None) -> dict:
+    """
+    Pick a 10–15s clip with a vertical ≤1080p rendition from the search index.
+    With `taken`, clips the item already uses are skipped for the next
+    result, as long as there is one. Nothing is claimed here: hedged
+    searches pick from both providers, only the winner is claimed.
+    Returns {"provider", "video_id", "duration", "width", "height", "url"}.
+    """
+    rows = search_index.query(provider, keyword, MIN_DURATION, MAX_DURATION, MAX_WIDTH)
+
+    if not rows:
+        raise RuntimeError(f"No vertical ≤1080p {label} videos in 10–15s range")
+
+    video_ids = sorted({r["video_id"] for r in rows})
+    random.shuffle(video_ids)
+    video_id = next(
+        (v for v in video_ids if not _is_taken(taken, provider, v)),
+        video_ids[0]
+    )
+    best = max(
+        (r for r in rows if r["video_id"] == video_id),
+        key=lambda x: x["width"]
+    )
+    return {"provider": provider, **best}
 
 
 # ────────────────────────────────
 # PEXELS
 # ────────────────────────────────
-def download_from_pexels(keyword: str, save_path: str):
+def fetch_pexels_results(keyword: str) -> list:
+    """
+    Live search; one row per rendition, ready for search_index.store().
+    """
     if not PEXELS_API_KEY:
         raise RuntimeError("PEXELS_API_KEY not set")
+    _check_blocked("Pexels")
 
     headers = {"Authorization": PEXELS_API_KEY}
     params = {
@@ -48,38 +251,45 @@ def download_from_pexels(keyword: str, save_path: str):
         "per_page": 20
     }
 
-    r = requests.get(PEXELS_VIDEO_API, headers=headers, params=params, timeout=TIMEOUT)
+    r = get_session(PEXELS_VIDEO_API).get(PEXELS_VIDEO_API, headers=headers, params=params, timeout=TIMEOUT)
+    _note_rate_limit("Pexels", r, reset_is_epoch=True)
     r.raise_for_status()
     data = r.json()
 
-    videos = [
-        v for v in data.get("videos", [])
-        if MIN_DURATION <= v.get("duration", 0) <= MAX_DURATION
+    return [
+        {
+            "video_id": str(v["id"]),
+            "duration": v.get("duration", 0),
+            "width": f["width"],
+            "height": f["height"],
+            "url": f["link"],
+        }
+        for v in data.get("videos", [])
+        for f in v.get("video_files", [])
+        if f.get("width") and f.get("height")
     ]
 
-    if not videos:
-        raise RuntimeError("No Pexels videos in 10–15s range")
-
-    video = random.choice(videos)
 
-    files = [
-        f for f in video["video_files"]
-        if f["height"] > f["width"] and f["width"] <= MAX_WIDTH
-    ]
+def search_pexels(keyword: str, taken=None) -> dict:
+    if not search_index.is_fresh("pexels", keyword):
+        search_index.store("pexels", keyword, fetch_pexels_results(keyword))
+    return _pick_candidate("pexels", "Pexels", keyword, taken)
 
-    if not files:
-        raise RuntimeError("No suitable vertical ≤1080p Pexels video")
 
-    best = max(files, key=lambda x: x["width"])
-    download_file(best["link"], save_path)
+def download_from_pexels(keyword: str, save_path: str):
+    download_file(search_pexels(keyword)["url"], save_path)
 
 
 # ────────────────────────────────
 # PIXABAY
 # ────────────────────────────────
-def download_from_pixabay(keyword: str, save_path: str):
+def fetch_pixabay_results(keyword: str) -> list:
+    """
+    Same contract as fetch_pexels_results().
+    """
     if not PIXABAY_API_KEY:
         raise RuntimeError("PIXABAY_API_KEY not set")
+    _check_blocked("Pixabay")
 
     params = {
         "key": PIXABAY_API_KEY,
@@ -88,53 +298,222 @@ def download_from_pixabay(keyword: str, save_path: str):
         "per_page": 20
     }
 
-    r = requests.get(PIXABAY_VIDEO_API, params=params, timeout=TIMEOUT)
+    r = get_session(PIXABAY_VIDEO_API).get(PIXABAY_VIDEO_API, params=params, timeout=TIMEOUT)
+    _note_rate_limit("Pixabay", r, reset_is_epoch=False)
     r.raise_for_status()
     data = r.json()
 
-    hits = [
-        h for h in data.get("hits", [])
-        if MIN_DURATION <= h.get("duration", 0) <= MAX_DURATION
+    return [
+        {
+            "video_id": str(h["id"]),
+            "duration": h.get("duration", 0),
+            "width": v["width"],
+            "height": v["height"],
+            "url": v["url"],
+        }
+        for h in data.get("hits", [])
+        for v in h.get("videos", {}).values()
+        if v.get("url") and v.get("width") and v.get("height")
     ]
 
-    if not hits:
-        raise RuntimeError("No Pixabay videos in 10–15s range")
 
-    video = random.choice(hits)
+def search_pixabay(keyword: str, taken=None) -> dict:
+    if not search_index.is_fresh("pixabay", keyword):
+        search_index.store("pixabay", keyword, fetch_pixabay_results(keyword))
+    return _pick_candidate("pixabay", "Pixabay", keyword, taken)
+
+
+def download_from_pixabay(keyword: str, save_path: str):
+    download_file(search_pixabay(keyword)["url"], save_path)
+
+
+FETCHERS = {"pexels": fetch_pexels_results, "pixabay": fetch_pixabay_results}
+
 
-    candidates = [
-        v for v in video["videos"].values()
-        if v["height"] > v["width"] and v["width"] <= MAX_WIDTH
+# ────────────────────────────────
+# Prefetch search results ahead of the content calendar
+# ────────────────────────────────
+def prefetch_search_index(keywords, max_workers=FETCH_WORKERS) -> int:
+    """
+    Store fresh search results for every (provider, keyword) pair that is
+    missing from the index or older than its TTL. Returns searches made.
+    """
+    jobs = [
+        (provider, keyword)
+        for keyword in sorted(set(keywords))
+        for provider in FETCHERS
+        if not search_index.is_fresh(provider, keyword)
     ]
 
-    if not candidates:
-        raise RuntimeError("No suitable vertical ≤1080p Pixabay video")
+    def fetch(job):
+        provider, keyword = job
+        try:
+            search_index.store(provider, keyword, FETCHERS[provider](keyword))
+            print(f"✅ Indexed {provider} results for '{keyword}'")
+            return True
+        except Exception as e:
+            print(f"⚠️ {provider} search failed for '{keyword}': {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return sum(pool.map(fetch, jobs))
+
+
+# ────────────────────────────────
+# Hedged search across providers
+# ────────────────────────────────
+SEARCHES = {"Pexels": search_pexels, "Pixabay": search_pixabay}
+_search_pool = ThreadPoolExecutor(max_workers=2 * FETCH_WORKERS)
+
 
-    best = max(candidates, key=lambda x: x["width"])
-    download_file(best["url"], save_path)
+def hedged_search(keyword: str, mode: str = HEDGE_MODE, taken=None) -> dict:
+    """
+    `taken` is passed on to the searches (see _pick_candidate).
+    "race":    query both providers at once, first usable candidate wins.
+    "delayed": query one, start the other only if the first is slower than
+               its p90 latency (or fails); first usable candidate wins.
+    "off":     try providers one after another (old behaviour).
+    """
+    names = list(SEARCHES)
+    random.shuffle(names)
+
+    if mode == "off":
+        for name in names:
+            try:
+                return _timed_search(name, SEARCHES[name], keyword, taken)
+            except Exception as e:
+                print(f"⚠️ {name} failed: {e}")
+        raise RuntimeError(f"No provider returned a clip for '{keyword}'")
+
+    futures = {}
+
+    def start(name):
+        future = _search_pool.submit(_timed_search, name, SEARCHES[name], keyword, taken)
+        futures[future] = name
+        return future
+
+    first = start(names[0])
+    if mode == "race":
+        start(names[1])
+    else:
+        wait([first], timeout=_hedge_delay(names[0]))
+        if not (first.done() and first.exception() is None):
+            start(names[1])
+
+    try:
+        for future in as_completed(futures):
+            try:
+                return future.result()
+            except Exception as e:
+                print(f"⚠️ {futures[future]} failed: {e}")
+    finally:
+        # The loser's result is dropped; a queued search never starts
+        for future in futures:
+            future.cancel()
+
+    raise RuntimeError(f"No provider returned a clip for '{keyword}'")
 
 
 # ────────────────────────────────
 # Public API
 # ────────────────────────────────
-def download_bg_video(keyword: str, output_path: str):
+def _download(keyword: str, output_path: str, taken=None, stop=None):
+    """
+    Blocking half of download_bg_video(): link a cached clip or search and
+    download a new one. Returns the candidate to cache, None on a cache hit.
+    """
+    cached = clip_cache.lookup_keyword(keyword)
+    random.shuffle(cached)
+    hit = next(
+        (c for c in cached if _claim(taken, c["provider"], c["video_id"])),
+        None
+    )
+    if hit:
+        link_into(hit["path"], output_path)
+        clip_cache.mark_used(hit["key"])
+        print(f"♻️ Cache hit {hit['key']} → {output_path}")
+        return None
+
+    candidate = hedged_search(keyword, taken=taken)
+    # Another download of the item may have claimed the same clip since
+    # the search: pick again from the winner's indexed results
+    while not _claim(taken, candidate["provider"], candidate["video_id"]):
+        candidate = _pick_candidate(
+            candidate["provider"], candidate["provider"].capitalize(), keyword, taken
+        )
+        if _is_taken(taken, candidate["provider"], candidate["video_id"]):
+            break  # every result is in use: repeat one
+    rendition = f"{candidate['width']}x{candidate['height']}"
+    cached_path = clip_cache.get(candidate["provider"], candidate["video_id"], rendition)
+
+    if cached_path:
+        link_into(cached_path, output_path)
+        print(f"♻️ Cache hit {candidate['provider']}/{candidate['video_id']} → {output_path}")
+    else:
+        download_file(candidate["url"], output_path, stop)
+        print(f"✅ {candidate['provider']} success → {output_path}")
+    return candidate
+
+
+async def download_bg_video(keyword: str, output_path: str, taken=None):
     """
     Download a vertical background video (10–15s, ≤1080p).
-    Randomly tries Pexels or Pixabay, falls back automatically.
+    Reuses a cached clip for the keyword when there is one; otherwise
+    searches Pexels and Pixabay hedged (see HEDGE_MODE), validates the
+    download with a probe and caches it.
+    `taken` is a set of (provider, video_id) shared by one item's
+    downloads, so a repeated keyword gets a different clip each time.
+    Network I/O runs in a thread, the probe on the event loop.
     """
-    sources = [download_from_pexels, download_from_pixabay]
-    random.shuffle(sources)
+    try:
+        candidate = await run_in_thread(_download, keyword, output_path, taken)
+        if candidate is None:
+            return output_path
 
-    for source in sources:
-        name = "Pexels" if source == download_from_pexels else "Pixabay"
+        # Probe on arrival: a corrupt or truncated clip never reaches
+        # the cache or the encoder
         try:
-            source(keyword, output_path)
-            print(f"✅ {name} success → {output_path}")
-            return output_path
-        except Exception as e:
-            print(f"⚠️ {name} failed: {e}")
+            await validate_clip(output_path)
+        except InvalidMedia:
+            os.remove(output_path)
+            raise
+
+        await asyncio.to_thread(clip_cache.put, candidate, output_path, keyword)
+        return output_path
+    except Exception as e:
+        print(f"⚠️ {e}")
 
     print(f"❌ Failed to download video for '{keyword}'")
     return None
 
 
+async def download_bg_videos(jobs, max_workers=FETCH_WORKERS, on_downloaded=None, post_workers=2):
+    """
+    Download many (keyword, output_path) jobs concurrently. Jobs repeating
+    a keyword get distinct clips while the cache and the search results
+    have enough of them.
+    If `on_downloaded(path)` is given (an async callable, e.g. clip
+    normalization), it runs as soon as each clip lands, overlapping the
+    other downloads, at most `post_workers` at a time; its return value
+    replaces the path.
+    Returns the output paths in job order, with None for failed jobs.
+    """
+    downloads = asyncio.Semaphore(max_workers)
+    post = asyncio.Semaphore(post_workers)
+    taken = set()
+
+    async def fetch(job):
+        keyword, output_path = job
+        async with downloads:
+            path = await download_bg_video(keyword, output_path, taken)
+        if not path or not on_downloaded:
+            return path
+
+        async with post:
+            try:
+                return await on_downloaded(path)
+            except Exception as e:
+                print(f"❌ Post-processing failed: {e}")
+                return None
+
+    return list(await gather_all(*(fetch(job) for job in jobs)))
@@ -1,13 +1,96 @@
+import asyncio
+import functools
+import hashlib
 import os
+import shutil
+import threading
 
-def get_next_video_path(content_id):
+# SQLite indexes and cached clips/audio. A local disk per host: workers on
+# several hosts sharing one root (see worker.py) each point it elsewhere
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+
+class Stopped(RuntimeError):
+    """
+    Blocking work gave up because its stop event was set (run_in_thread).
+    """
+
+
+def get_video_paths(content_id, count):
+    """
+    Pre-allocate `count` clip paths (video_1.mp4 ... video_N.mp4) for an item
+    without listing the directory, so concurrent downloads never collide.
+    """
     base_dir = os.path.join("videos", str(content_id))
     os.makedirs(base_dir, exist_ok=True)
 
-    existing = [
-        f for f in os.listdir(base_dir)
-        if f.startswith("video_") and f.endswith(".mp4")
+    return [
+        os.path.join(base_dir, f"video_{i}.mp4")
+        for i in range(1, count + 1)
     ]
 
-    next_index = len(existing) + 1
-    return os.path.join(base_dir, f"video_{next_index}.mp4")
+
+def link_into(src, dest):
+    """
+    Hard-link a cached file into a work directory (copy across devices).
+    """
+    dirname = os.path.dirname(dest)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    asyncio.to_thread() that can be stopped: `func` gets a threading.Event
+    as `stop=` and checks it between chunks (raising Stopped). Cancelling
+    sets it and waits for the thread to return, so no network transfer
+    outlives its task.
+    """
+    stop = threading.Event()
+    future = asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(func, *args, stop=stop, **kwargs)
+    )
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        stop.set()
+        # However often this is cancelled meanwhile (e.g. by gather_all)
+        while not future.done():
+            try:
+                await asyncio.wait({future})
+            except asyncio.CancelledError:
+                pass
+        if not future.cancelled():
+            future.exception()
+        raise
+
+
+async def gather_all(*aws):
+    """
+    asyncio.gather() that ends only once every awaitable has: if it is
+    cancelled or one of them fails, the others are cancelled and awaited.
+    (A plain gather returns at the first cancelled or failed child, while
+    the others may still run ffmpeg or a transfer thread.)
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
@@ -0,0 +1,221 @@
+import json
+import os
+import time
+import uuid
+
+# Stage jobs for workers on several hosts: plain files in a folder every
+# host mounts (JOB_SPOOL), one subfolder per state. Each transition is a
+# single os.rename, atomic on a local disk and on NFS alike, so exactly one
+# worker's rename wins a job; nothing relies on file locks or on SQLite
+# (whose WAL needs memory shared between the processes). Lease deadlines
+# are part of the file name and read against each host's clock, so keep
+# the hosts NTP-synced.
+#   ready/<order>_<date>_<position>_<stage>_<attempts>_<item_id>
+#   leased/<ready name>~<token>~<deadline>
+#   done/, failed/, deferred/<leased name>  (JSON: video_id, error, reason)
+#   quota/<day>/spend_<units>_<token>, exhausted_<limit>
+JOB_SPOOL = os.getenv("JOB_SPOOL")
+STATES = ("ready", "leased", "done", "failed", "deferred")
+
+
+# ---------------------------------------------------------
+# Utility: folders, names and moves
+# ---------------------------------------------------------
+def _folder(*parts):
+    path = os.path.join(JOB_SPOOL, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _parse(name):
+    base, _, lease = name.partition("~")
+    order, date, position, stage, attempts, item_id = base.split("_", 5)
+    return {
+        "item_id": item_id, "stage": stage, "date": date, "position": int(position),
+        "order": order, "attempts": int(attempts), "name": name,
+    }
+
+
+def _ready_name(job, attempts):
+    return f"{job['order']}_{job['date']}_{job['position']:06d}_{job['stage']}_{attempts}_{job['item_id']}"
+
+
+def _move(name, src, dst, new_name=None) -> bool:
+    target = os.path.join(_folder(dst), new_name or name)
+    try:
+        os.rename(os.path.join(_folder(src), name), target)
+    except FileNotFoundError:
+        # Another worker moved it first. Over NFS a retransmitted rename
+        # that did succeed reports this too: then the file is where we put it
+        return os.path.exists(target)
+    return True
+
+
+def _finish(name, state, data) -> bool:
+    # "r+" never recreates a leased file someone else has moved on; the
+    # JSON is in place before the file shows up in its final state
+    try:
+        with open(os.path.join(_folder("leased"), name), "r+", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.truncate()
+    except FileNotFoundError:
+        return False
+    return _move(name, "leased", state)
+
+
+def _reclaim_expired(now, max_attempts):
+    # A worker that stopped heartbeating lost its job; crashes count as attempts
+    for name in os.listdir(_folder("leased")):
+        if float(name.rsplit("~", 1)[1]) >= now:
+            continue
+        job = _parse(name)
+        if job["attempts"] + 1 >= max_attempts:
+            _finish(name, "failed", {"error": "lease expired"})
+        else:
+            _move(name, "leased", "ready", _ready_name(job, job["attempts"] + 1))
+
+
+# ---------------------------------------------------------
+# Public API (called through work_queue when JOB_SPOOL is set)
+# ---------------------------------------------------------
+def add_job(item_id, date, position, stage, rank):
+    # Lower order sorts first: later stages are claimed first
+    job = {"order": 9 - rank, "date": date, "position": position, "stage": stage, "item_id": item_id}
+    open(os.path.join(_folder("ready"), _ready_name(job, 0)), "a").close()
+
+
+def claim(stages, lease, max_attempts):
+    now = time.time()
+    _reclaim_expired(now, max_attempts)
+
+    for name in sorted(os.listdir(_folder("ready"))):
+        job = _parse(name)
+        if job["stage"] not in stages:
+            continue
+        token = uuid.uuid4().hex
+        leased = f"{name}~{token}~{now + lease:.3f}"
+        if _move(name, "ready", "leased", leased):
+            return {**job, "token": token, "name": leased}
+
+    return None
+
+
+def heartbeat(job, lease) -> bool:
+    # Renamed to a new deadline: fails once the lease was reclaimed
+    base, token, _ = job["name"].split("~")
+    name = f"{base}~{token}~{time.time() + lease:.3f}"
+    if not _move(job["name"], "leased", "leased", name):
+        return False
+    job["name"] = name
+    return True
+
+
+def complete(job, video_id=None) -> bool:
+    return _finish(job["name"], "done", {"video_id": video_id})
+
+
+def fail(job, error, max_attempts):
+    if job["attempts"] + 1 >= max_attempts:
+        _finish(job["name"], "failed", {"error": error})
+    else:
+        _move(job["name"], "leased", "ready", _ready_name(job, job["attempts"] + 1))
+
+
+def defer(job, reason) -> bool:
+    return _finish(job["name"], "deferred", {"reason": reason})
+
+
+def release_deferred() -> int:
+    released = 0
+    for name in os.listdir(_folder("deferred")):
+        job = _parse(name)
+        released += _move(name, "deferred", "ready", _ready_name(job, job["attempts"]))
+    return released
+
+
+def requeue(item_id=None) -> int:
+    """
+    Failed jobs (of one item, or all) back to ready with no attempts.
+    """
+    requeued = 0
+    for name in os.listdir(_folder("failed")):
+        job = _parse(name)
+        if item_id is None or job["item_id"] == item_id:
+            requeued += _move(name, "failed", "ready", _ready_name(job, 0))
+    return requeued
+
+
+def outcomes():
+    """
+    (state, job) for every done, failed or deferred job, each job with
+    the JSON its worker left (video_id, error or reason).
+    """
+    for state in ("done", "failed", "deferred"):
+        folder = _folder(state)
+        for name in os.listdir(folder):
+            try:
+                with open(os.path.join(folder, name), encoding="utf-8") as f:
+                    data = json.loads(f.read() or "{}")
+            except FileNotFoundError:
+                continue
+            yield state, {**_parse(name), **data}
+
+
+def item_ids() -> set:
+    """
+    Items with a job in any state.
+    """
+    return {
+        _parse(name)["item_id"]
+        for state in STATES
+        for name in os.listdir(_folder(state))
+    }
+
+
+def job_counts() -> dict:
+    counts = {}
+    for state in STATES:
+        for name in os.listdir(_folder(state)):
+            key = f"{_parse(name)['stage']}:{state}"
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def active_jobs() -> int:
+    return len(os.listdir(_folder("ready"))) + len(os.listdir(_folder("leased")))
+
+
+# ---------------------------------------------------------
+# YouTube quota: one file per spend, summed by every host
+# ---------------------------------------------------------
+def spend_quota(day, units, limit) -> bool:
+    # Written before counting: a spend is kept only if it fits with every
+    # spend written before the count, so concurrent spenders never overdraw
+    # (at worst both back off)
+    path = os.path.join(_folder("quota", day), f"spend_{units}_{uuid.uuid4().hex}")
+    open(path, "x").close()
+    spent, exhausted = _tally(day)
+    if not exhausted and spent <= limit:
+        return True
+    os.remove(path)
+    return False
+
+
+def exhaust_quota(day, limit):
+    # Refuses every later spend of the day (see spend_quota)
+    open(os.path.join(_folder("quota", day), f"exhausted_{limit}"), "a").close()
+
+
+def _tally(day):
+    spent = exhausted = 0
+    for name in os.listdir(_folder("quota", day)):
+        kind, units = name.split("_")[:2]
+        if kind == "exhausted":
+            exhausted = max(exhausted, int(units))
+        elif kind == "spend":
+            spent += int(units)
+    return spent, exhausted
+
+
+def quota_spent(day) -> int:
+    return max(_tally(day))
@@ -1,133 +1,189 @@
 import os
-import json
 import asyncio
-from read_input import read_input
-from generate_audio import generate_audio
-from generate_bg import download_bg_video
-from helper import get_next_video_path
-from make_videos import final_videos
-from yt_schedule import upload_video_to_yt , get_authenticated_service
+import argparse
+from content_store import RUN_DATE, get_item, iter_items
+from make_videos import ensure_subtitles
+from render_scheduler import NORMALIZE_WORKERS, process_pool, render_job as render_job_fn, thread_budget
+from pipeline import run_pipeline
+from manifest import RunManifest
+from stages import (
+    WORK_DIRS, cleanup_item, has_content, prepare_item, publish_times,
+    record_render, render_job, upload_item
+)
+from uploader import QuotaExceeded, UploadEngine
+import work_queue
 import time
-from datetime import datetime, timedelta, timezone
+from datetime import date, timedelta
 import shutil
 
 
+# ---------------------------------------------------------
+# Queue the requested days; the queue also still holds anything
+# an earlier run did not finish, and hands out the earliest first
+# ---------------------------------------------------------
+def queue_days(start, days):
+    end = (date.fromisoformat(start) + timedelta(days=days - 1)).isoformat()
+    batch = []
+    for item in iter_items(start, end):
+        if not has_content(item):
+            print(f"Skipping ID {item.get('id')} (empty content)")
+            continue
+        batch.append(item)
+    added = work_queue.enqueue(batch)
+    print(f"Queued {added} new items for {start} → {end} ({work_queue.counts()})")
+
 
-AUDIO_DIR = "audio"
-VIDEOS_DIR = "final_videos"
-SUBTITLE_DIR = "subtitles"
-BG_VIDEOS='videos'
+# ---------------------------------------------------------
+# Coordinator: turn queued items into stage jobs for worker.py
+# ---------------------------------------------------------
+def coordinate(start=RUN_DATE, days=1):
+    queue_days(start, days)
+    submitted = work_queue.submit_jobs()
+    print(f"Submitted {submitted} items to workers ({work_queue.job_counts()})")
 
-async def main():
-    os.makedirs(AUDIO_DIR, exist_ok=True)
-    os.makedirs(VIDEOS_DIR, exist_ok=True)
-    os.makedirs(SUBTITLE_DIR, exist_ok=True)
 
+async def main(fresh=False, start=RUN_DATE, days=1):
+    # The render pool comes first, before this process starts any thread
+    # (to_thread, edge-tts, uploads), and never forks it (see process_pool)
+    # Renders and clip normalizations share the cores (RENDER_WORKERS)
+    render_workers, render_threads = thread_budget(reserve=NORMALIZE_WORKERS)
+    render_pool = process_pool(render_workers)
 
-    json_data = read_input()
-    
-    output_file = "output.json"
+    # Runs resume by default: the work files and manifest entries of
+    # deferred and rendered-ahead items are what the queue resumes from
+    # (cleanup_item drops each item's files once it is uploaded)
+    if fresh:
+        for folder in WORK_DIRS:
+            if os.path.exists(folder):
+                shutil.rmtree(folder)
+                print(f"Deleted {folder}")
 
-    data = []
+    manifest = RunManifest(reset=fresh)
 
-    if json_data and json_data != "[]":
-        data = json.loads(json_data)
-    elif os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-        with open(output_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+    queue_days(start, days)
+
+    data = [item for item in map(get_item, work_queue.pending()) if item]
 
     if not data:
-        print("No entries found for today.")
+        print("No pending entries.")
+        render_pool.shutdown()
         return
 
-    print(f"{len(data)} contents found. Generating audio...")
+    print(f"{len(data)} contents pending. Starting pipeline...")
 
-    for item in data:
-        content_id = item.get("id")
-        content_text = item.get("content", "").strip()
-        bg_videos = item.get("bg_vedios", [])
+    scheduled_times = publish_times(data)
 
-        if not content_text:
-            print(f"Skipping ID {content_id} (empty content)")
-            continue
+    # Slots are fixed above, so finished items can drop out here
+    uploaded = [item for item in data if manifest.done(item.get("id"), "upload")]
+    for item in uploaded:
+        video_id = manifest.get(item.get("id"), "upload")["video_id"]
+        print(f"Skipping ID {item.get('id')} (already uploaded: {video_id})")
+        work_queue.mark_done(item.get("id"), video_id)
+    data = [item for item in data if item not in uploaded]
 
-        audio_path = os.path.join(AUDIO_DIR, f"audio_{content_id}.mp3")
+    # Shared credentials, one HTTP transport per upload thread
+    uploader = UploadEngine()
 
-        if not os.path.exists(audio_path):
-            await generate_audio(
-                text=content_text,
-                output_file=audio_path,
-                voice="en-US-JennyNeural"
-            )
-            print(f"Audio generated for ID {content_id}")
+    # The day's quota decides which items upload: the earliest ones that
+    # fit (upload + thumbnail each). The rest still render ahead, and wait.
+    upload_ids = {item["id"] for item in data[:uploader.quota.affordable()]}
+    deferred = set()
+    print(f"{len(upload_ids)} of {len(data)} items fit today's YouTube quota")
 
-        # Download BG videos
-        for bg in bg_videos:
-            try:
-                video_path = get_next_video_path(content_id)               
-                download_bg_video(bg, video_path)
-                print(f"Downloaded {video_path}")
+    loop = asyncio.get_running_loop()
 
-            except Exception as e:
-                print(f"Failed downloading BG video for ID {content_id}: {e}")
+    # Network stage: TTS (shared rate limiter) + clip downloads
+    async def prepare_stage(item):
+        await prepare_item(item, manifest, threads=render_threads)
 
-    for item in data:
+    # CPU stage: final_videos in a worker process with its thread budget
+    async def render_stage(item):
         content_id = item.get("id")
-        merged_videos_path = f"final_videos/merged_{content_id}.mp4"
-        ass_files = f"subtitles/tiktok_style_{content_id}.ass"
-        final_name = f"final_videos/shorts_{content_id}.mp4"
-        bg_root = f"videos/{content_id}"
-        audio_root=f"audio/audio_{content_id}.mp3"
-        final_videos(content_id,merged_videos_path,ass_files,final_name,bg_root,audio_root)
-
-    TOTAL_MINUTES = 24 * 60  # 1440
-    video_count = len(data)
-    gap_minutes = TOTAL_MINUTES // video_count
-
-    if video_count == 0:
-        raise ValueError("No videos to schedule")
-    
-    start_time = datetime.now(timezone.utc).replace(
-    hour=0, minute=0, second=0, microsecond=0
-)
-    yt= get_authenticated_service()
-    for index, item in enumerate(data):
+        if manifest.done(content_id, "render"):
+            print(f"Render already done for ID {content_id}")
+            return
+
+        job = render_job(content_id)
+        # Whisper (when subtitles are missing) runs here, on the one warm
+        # model; the pool process only encodes
+        if not await ensure_subtitles(job["audio_root"], job["ass_files"]):
+            raise RuntimeError(f"No subtitles for ID {content_id}")
+        await loop.run_in_executor(render_pool, render_job_fn, job, render_threads)
+        record_render(manifest, job)
+
+    # Uplink stage
+    async def upload_stage(item):
         content_id = item.get("id")
-        title = item.get("title")
-        description = item.get("description")        
-        tags = item.get("tags")
-        hashtags = " ".join(
-            tag.strip() if tag.strip().startswith("#") else f"#{tag.strip()}"
-            for tag in tags
-            if tag.strip()
+        # Once the quota is spent nothing else is sent, even if planned
+        if content_id not in upload_ids or not uploader.quota.affordable():
+            work_queue.mark_deferred(content_id, "upload", "YouTube quota spent")
+            deferred.add(content_id)
+            print(f"⏸️ Upload of ID {content_id} deferred to the next quota day")
+            return
+        try:
+            video_id = await asyncio.to_thread(
+                upload_item, uploader, item, manifest, scheduled_times[content_id]
+            )
+        except QuotaExceeded as e:
+            work_queue.mark_deferred(content_id, "upload", str(e))
+            deferred.add(content_id)
+            print(f"⏸️ Upload of ID {content_id} deferred: {e}")
+            return
+        work_queue.mark_done(content_id, video_id)
+        cleanup_item(content_id)
+
+    # Item N uploads while N+1 renders and N+2 fetches
+    with render_pool:
+        results = await run_pipeline(
+            data,
+            prepare_stage,
+            render_stage,
+            upload_stage,
+            render_workers=render_workers
         )
-        final_description = description.strip()
-        if hashtags:
-            final_description += "\n\n" + hashtags
 
-        keywords = item.get("keywords")
-        vedio_path=f"final_videos/shorts_{content_id}.mp4"
-        
-        scheduled_time = (
-        start_time + timedelta(minutes=index * gap_minutes)
-    ).isoformat(timespec="seconds")
-       
-        yt_upload=upload_video_to_yt(yt,vedio_path,title,final_description,keywords,scheduled_time)
-        print(yt_upload)
-            
+    for content_id, result in results.items():
+        if content_id in deferred:
+            print(f"ID {content_id}: rendered, upload deferred")
+            continue
+        status = "done" if result["ok"] else f"failed at {result['stage']}: {result['error']}"
+        print(f"ID {content_id}: {status}")
+        if not result["ok"]:
+            work_queue.mark_failed(content_id, result["stage"], result["error"])
+
+    print(f"Work queue: {work_queue.counts()}")
+
+    print(f"YouTube API: {uploader.quota.summary()}")
 
 
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--fresh", action="store_true",
+        help="Drop every work file and the run manifest first, redoing all "
+             "stages of queued items (by default stages the manifest records "
+             "as done and still valid are skipped)"
+    )
+    parser.add_argument(
+        "--start", default=RUN_DATE,
+        help="First content date to queue (YYYY-MM-DD)"
+    )
+    parser.add_argument(
+        "--days", type=int, default=1,
+        help="Queue this many days from --start and render them ahead"
+    )
+    parser.add_argument(
+        "--coordinate", action="store_true",
+        help="Only queue the days as jobs for worker.py processes"
+    )
+    args = parser.parse_args()
+
     start_time = time.time()
-    asyncio.run(main())
-    folders = [AUDIO_DIR, VIDEOS_DIR, SUBTITLE_DIR, BG_VIDEOS]
-    for folder in folders:
-        if os.path.exists(folder):
-            shutil.rmtree(folder)
-            print(f"Deleted {folder}")
-        else:
-            print(f"{folder} does not exist, skipping")
+    if args.coordinate:
+        coordinate(start=args.start, days=args.days)
+    else:
+        asyncio.run(main(fresh=args.fresh, start=args.start, days=args.days))
     
 
@@ -1,50 +1,213 @@
 import os
-import json
-import subprocess
-import whisper
+import asyncio
+import re
+from transcriber import WHISPER_BACKEND, WHISPER_MODEL, get_worker
+from subtitles import write_ass_subtitles
+from tts_cache import get_transcript, put_transcript
+from planner import loop_to_cover
+from media_runner import FFMPEG_TIMEOUT, print_progress, run_media
+from media_info import keyframes, probe
+from helper import gather_all
 
 
 # ---------------------------------------------------------
-# Utility: Run subprocess safely
+# Utility: Run ffmpeg safely (timeout, bounded stderr, progress)
 # ---------------------------------------------------------
-def run(cmd):
-    subprocess.run(
-        cmd,
-        check=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
+async def run(cmd, output, timeout=FFMPEG_TIMEOUT):
+    """
+    media_runner.run_media with progress reports labelled by `output`, the
+    command's main output (thumbnail and preview outputs may follow it).
+    Cancelling the caller kills ffmpeg.
+    """
+    label = os.path.basename(output)
+    return await run_media(cmd, timeout, print_progress(label))
+
+
+# ---------------------------------------------------------
+# Utility: per-job ffmpeg thread budget (None → ffmpeg default)
+# ---------------------------------------------------------
+def thread_args(threads):
+    return ["-threads", str(threads)] if threads else []
+
+
+# ---------------------------------------------------------
+# Utility: Get duration (cached probe, see media_info)
+# ---------------------------------------------------------
+async def get_duration(path: str) -> float:
+    return (await probe(path))["duration"]
+
+
+# ---------------------------------------------------------
+# Utility: background clips of one item, in merge order
+# ---------------------------------------------------------
+def _clip_number(path):
+    # video_2.mp4 before video_10.mp4
+    match = re.search(r"(\d+)\.mp4$", path, re.IGNORECASE)
+    return (int(match.group(1)) if match else -1, path)
+
+
+def list_bg_videos(video_dir):
+    return sorted(
+        (
+            os.path.abspath(os.path.join(video_dir, f)).replace("\\", "/")
+            for f in os.listdir(video_dir)
+            if f.lower().endswith(".mp4")
+        ),
+        key=_clip_number
     )
 
 
 # ---------------------------------------------------------
-# Utility: Get duration using ffprobe
+# INGEST: normalize one clip to the canonical intermediate
+# (h264 1080x1920, 30fps, yuv420p) so that merging becomes a
+# concat-demuxer stream copy
 # ---------------------------------------------------------
-def get_duration(path: str) -> float:
-    cmd = [
-        "ffprobe", "-v", "error",
-        "-show_entries", "format=duration",
-        "-of", "json",
-        path
-    ]
+NORMALIZED_DIR = "norm"
+GOP = 30
+# One profile/level for every intermediate: with the same encoder
+# settings all clips share one SPS/PPS, which concat stream copy needs
+H264_PROFILE = ("-profile:v", "high", "-level:v", "4.1")
+
+
+async def normalize_clip(
+    src,
+    dst=None,
+    width=1080,
+    height=1920,
+    fps=30,
+    start=0.0,
+    duration=None,
+    threads=None
+) -> str:
+    """
+    `start`/`duration` select the planned range (see planner.plan_clips);
+    the rest of the clip is never decoded past nor encoded.
+    Every clip is re-encoded, even one already 1080x1920 h264: stock clips
+    come from different encoders (GOP, profile, SPS/PPS), and only
+    intermediates made with the same settings can be joined by copy.
+    """
+    info = await probe(src)
+
+    filters = []
+    if (info["width"], info["height"]) != (width, height):
+        filters.append(
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2"
+        )
+    if round(info["fps"], 2) != fps:
+        filters.append(f"fps={fps}")
+    filters.extend(["setsar=1", "format=yuv420p"])
+
+    if dst is None:
+        dst = os.path.join(os.path.dirname(src), NORMALIZED_DIR, os.path.basename(src))
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+    # Written under another name first so a half-done clip is never listed
+    part = dst + ".part"
+
+    cmd = ["ffmpeg", "-y"]
+    if start:
+        cmd.extend(["-ss", str(start)])
+    if duration:
+        cmd.extend(["-t", str(duration)])
+    cmd.extend([
+        "-i", src,
+        "-an",
+        "-vf", ",".join(filters),
+        "-c:v", "libx264",
+        "-preset", "veryfast",
+        "-crf", "18",
+        *H264_PROFILE,
+        "-pix_fmt", "yuv420p",
+        "-g", str(GOP),
+        "-keyint_min", str(GOP),
+        "-sc_threshold", "0",
+        "-video_track_timescale", "15360",
+        *thread_args(threads),
+        "-f", "mp4",
+        part
+    ])
+
+    await run(cmd, dst)
+    os.replace(part, dst)
+
+    print(f"🧪 Normalized {src} → {dst}")
+    return dst
+
+
+def normalized_videos(video_dir):
+    """
+    Canonical intermediates for an item, or None if it was not normalized
+    or any of its clips is missing one (renders then use the raw clips,
+    so a clip that failed normalization is never silently dropped).
+    """
+    norm_dir = os.path.join(video_dir, NORMALIZED_DIR)
+    if not os.path.isdir(norm_dir):
+        return None
+
+    normalized = list_bg_videos(norm_dir)
+    names = {os.path.basename(v) for v in normalized}
+    missing = [v for v in list_bg_videos(video_dir) if os.path.basename(v) not in names]
+    if missing:
+        print(f"⚠️ {len(missing)} clips were not normalized, rendering from the raw clips")
+        return None
+    return normalized or None
+
+
+def write_concat_list(videos, list_file):
+    with open(list_file, "w", encoding="utf-8") as f:
+        for v in videos:
+            escaped = v.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_file
+
+
+# ---------------------------------------------------------
+# Utility: scale/pad/fps every input, then concat → [label]
+# ---------------------------------------------------------
+def concat_filter(count, width, height, fps, label):
+    filters = []
+
+    for i in range(count):
+        filters.append(
+            f"[{i}:v]"
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+            f"fps={fps},"
+            f"setsar=1,"
+            f"format=yuv420p"
+            f"[v{i}]"
+        )
+
+    concat_inputs = "".join(f"[v{i}]" for i in range(count))
 
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
+    return (
+        ";".join(filters)
+        + f";{concat_inputs}concat=n={count}:v=1:a=0[{label}]"
     )
 
-    if result.returncode != 0:
-        raise RuntimeError(result.stderr)
 
-    data = json.loads(result.stdout)
-    return float(data["format"]["duration"])
+# ---------------------------------------------------------
+# Utility: speed-up needed to stretch footage over the audio
+# ---------------------------------------------------------
+def pick_speed(video_dur, audio_dur) -> float:
+    speed = 1.0
+
+    if video_dur < audio_dur:
+        if video_dur * 1.2 >= audio_dur:
+            speed = 1.2
+        elif video_dur * 1.25 >= audio_dur:
+            speed = 1.25
+        else:
+            speed = 1.25
+
+    return speed
 
 
 # ---------------------------------------------------------
 # PASS 1: Merge background videos (FAST, reusable)
 # ---------------------------------------------------------
-def merge_bg_videos(
+async def merge_bg_videos(
     video_dir,
     output_file,
     width=1080,
@@ -58,11 +221,27 @@ def merge_bg_videos(
         print(f"❌ Folder not found: {video_dir}")
         return False
 
-    videos = sorted(
-        os.path.abspath(os.path.join(video_dir, f)).replace("\\", "/")
-        for f in os.listdir(video_dir)
-        if f.lower().endswith(".mp4")
-    )
+    normalized = normalized_videos(video_dir)
+    if normalized:
+        # Clips already share size, rate and pixel format: remux, no re-encode
+        list_file = write_concat_list(
+            normalized, os.path.join(video_dir, NORMALIZED_DIR, "concat.txt")
+        )
+        cmd = [
+            "ffmpeg", "-y",
+            "-f", "concat", "-safe", "0",
+            "-i", list_file,
+            "-c", "copy",
+            output_file
+        ]
+
+        print(f"🎞️ Stream-copying {len(normalized)} normalized videos")
+        await run(cmd, output_file)
+
+        print(f"✅ Merged video created: {output_file}")
+        return True
+
+    videos = list_bg_videos(video_dir)
 
     if not videos:
         print("❌ No videos found")
@@ -71,26 +250,10 @@ def merge_bg_videos(
     print(f"🎞️ Merging {len(videos)} videos")
 
     inputs = []
-    filters = []
-
-    for i, v in enumerate(videos):
+    for v in videos:
         inputs.extend(["-i", v])
-        filters.append(
-            f"[{i}:v]"
-            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
-            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
-            f"fps={fps},"
-            f"setsar=1,"
-            f"format=yuv420p"
-            f"[v{i}]"
-        )
 
-    concat_inputs = "".join(f"[v{i}]" for i in range(len(videos)))
-
-    filter_complex = (
-        ";".join(filters)
-        + f";{concat_inputs}concat=n={len(videos)}:v=1:a=0[outv]"
-    )
+    filter_complex = concat_filter(len(videos), width, height, fps, "outv")
 
     cmd = [
         "ffmpeg", "-y",
@@ -107,107 +270,190 @@ def merge_bg_videos(
     print("🚀 Merging background videos...")
     print("🧾 FFmpeg command:\n", " ".join(cmd))
 
-    # IMPORTANT: don't swallow stderr during debugging
-    subprocess.run(cmd, check=True)
+    # Failures raise MediaError with the tail of ffmpeg's stderr
+    await run(cmd, output_file)
 
     print(f"✅ Merged video created: {output_file}")
     return True
 
 
 # ---------------------------------------------------------
-# Whisper → ASS subtitles (word-by-word)
+# Whisper → ASS subtitles (fallback when edge-tts timings
+# were not captured)
 # ---------------------------------------------------------
-def generate_ass_subtitles(
+async def generate_ass_subtitles(
     audio_path,
     ass_file,
-    whisper_model="base",
-    language="en"
+    whisper_model=WHISPER_MODEL,
+    backend=WHISPER_BACKEND,
+    language="en",
+    pending=None
 ) -> bool:
+    """
+    `pending` is a future from TranscriptionWorker.submit() on a worker
+    running `whisper_model`/`backend`; when it is not given the audio is
+    queued on the shared warm worker here.
+    """
 
     if not os.path.exists(audio_path):
         print(f"❌ Audio not found: {audio_path}")
         return False
 
-    print(f"🧠 Loading Whisper model: {whisper_model}")
-    model = whisper.load_model(whisper_model)
+    if pending is None:
+        pending = get_worker(whisper_model, backend).submit(audio_path, language)
 
-    print("🎙️ Transcribing audio...")
-    result = model.transcribe(
-        audio_path,
-        word_timestamps=True,
-        language=language
-    )
+    words = await asyncio.wrap_future(pending)
+    put_transcript(audio_path, words, whisper_model, backend)
 
-    def ass_time(t):
-        h = int(t // 3600)
-        m = int((t % 3600) // 60)
-        s = int(t % 60)
-        cs = int((t % 1) * 100)
-        return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
-
-    ass = """[Script Info]
-Title: TikTok Style
-ScriptType: v4.00+
-PlayResX: 1080
-PlayResY: 1920
-
-[V4+ Styles]
-Format: Name, Fontname, Fontsize, PrimaryColour, OutlineColour, BackColour, Bold, Italic, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV
-Style: Default,Arial Black,80,&H0000FFFF,&H00000000,&H80000000,-1,0,1,4,0,5,10,10,80
-
-[Events]
-Format: Layer, Start, End, Style, Text
-"""
-
-    word_count = 0
-    for seg in result.get("segments", []):
-        for w in seg.get("words", []):
-            ass += (
-                f"Dialogue: 0,"
-                f"{ass_time(w['start'])},"
-                f"{ass_time(w['end'])},"
-                f"Default,{w['word'].strip()}\n"
-            )
-            word_count += 1
-
-    with open(ass_file, "w", encoding="utf-8") as f:
-        f.write(ass)
+    word_count = write_ass_subtitles(words, ass_file)
 
     print(f"✅ ASS subtitles created ({word_count} words)")
     return True
 
 
+# ---------------------------------------------------------
+# Side outputs: thumbnail candidates and a small preview,
+# branched off the frames the final render already decodes
+# ---------------------------------------------------------
+THUMBNAIL_COUNT = int(os.getenv("THUMBNAIL_COUNT", "6"))
+SCENE_THRESHOLD = float(os.getenv("SCENE_THRESHOLD", "0.3"))
+
+
+def reset_thumbnails(thumbnails_dir):
+    """
+    Candidates (and their scores) of an earlier render must not outlive it.
+    """
+    os.makedirs(thumbnails_dir, exist_ok=True)
+    for f in os.listdir(thumbnails_dir):
+        if f.lower().endswith((".jpg", ".scores")):
+            os.remove(os.path.join(thumbnails_dir, f))
+
+
+def split_outputs(timeline, ass_file, audio_index, thumbnails_dir=None, preview_path=None, prefix="thumb", after=""):
+    """
+    `timeline` is the filter chain up to the trimmed picture. Returns the
+    graph ending in [v] (the short, with subtitles, then `after`) and the
+    output arguments of each extra branch:
+      thumbnails → `prefix`_NN.jpg at the first frame and at scene changes
+                   (scene score > SCENE_THRESHOLD), without subtitles;
+                   each frame's score goes to `prefix`.scores
+      preview    → 270x480, 15 fps, low bitrate, with audio
+    """
+    branches = []
+    extra_args = []
+
+    if thumbnails_dir:
+        os.makedirs(thumbnails_dir, exist_ok=True)
+        scores = os.path.join(thumbnails_dir, f"{prefix}.scores").replace("\\", "/")
+        branches.append((
+            "th",
+            f"select='eq(n,0)+gt(scene,{SCENE_THRESHOLD})',"
+            f"metadata=mode=print:key=lavfi.scene_score:file={scores},"
+            f"scale=720:1280[thumbs]"
+        ))
+        extra_args.extend([
+            "-map", "[thumbs]",
+            "-fps_mode", "vfr",
+            "-frames:v", str(THUMBNAIL_COUNT),
+            "-q:v", "3",
+            os.path.join(thumbnails_dir, f"{prefix}_%02d.jpg")
+        ])
+
+    if preview_path:
+        branches.append(("pv", "scale=270:480,fps=15[prev]"))
+        extra_args.extend([
+            "-map", "[prev]",
+            "-map", f"{audio_index}:a",
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-crf", "32",
+            "-c:a", "aac",
+            "-b:a", "64k",
+            "-shortest",
+            preview_path
+        ])
+
+    if not branches:
+        return f"{timeline},ass={ass_file}{after}[v]", []
+
+    labels = "".join(f"[{name}]" for name, _ in branches)
+    graph = f"{timeline},split={len(branches) + 1}[main]{labels};[main]ass={ass_file}{after}[v]"
+    for name, chain in branches:
+        graph += f";[{name}]{chain}"
+
+    return graph, extra_args
+
+
+def thumbnail_scores(thumbnails_dir) -> dict:
+    """
+    {JPEG path: scene score} from the .scores files split_outputs wrote:
+    the Nth frame printed there is `prefix`_{N+1}.jpg.
+    """
+    scores = {}
+    for f in os.listdir(thumbnails_dir):
+        if not f.endswith(".scores"):
+            continue
+        prefix = f[:-len(".scores")]
+        frame = None
+        with open(os.path.join(thumbnails_dir, f), encoding="utf-8") as lines:
+            for line in lines:
+                if line.startswith("frame:"):
+                    frame = int(line.split()[0][len("frame:"):])
+                elif line.startswith("lavfi.scene_score=") and frame is not None:
+                    path = os.path.join(thumbnails_dir, f"{prefix}_{frame + 1:02d}.jpg")
+                    scores[path] = float(line.split("=", 1)[1])
+    return scores
+
+
+def pick_thumbnail(thumbnails_dir):
+    """
+    Best candidate: the frame with the highest scene score (the sharpest
+    cut to a new shot), the larger JPEG on a tie, or None.
+    """
+    if not thumbnails_dir or not os.path.isdir(thumbnails_dir):
+        return None
+    scores = thumbnail_scores(thumbnails_dir)
+    candidates = [
+        os.path.join(thumbnails_dir, f)
+        for f in os.listdir(thumbnails_dir)
+        if f.lower().endswith(".jpg")
+    ]
+    return max(
+        candidates,
+        key=lambda path: (scores.get(path, 0.0), os.path.getsize(path)),
+        default=None
+    )
+
+
 # ---------------------------------------------------------
 # PASS 2: FINAL render (trim + speed + audio + subtitles)
 # ---------------------------------------------------------
-def final_render(
+async def final_render(
     merged_video,
     audio_path,
     ass_file,
-    output_path
+    output_path,
+    threads=None,
+    thumbnails_dir=None,
+    preview_path=None
 ) -> bool:
 
-    video_dur = get_duration(merged_video)
-    audio_dur = get_duration(audio_path)
+    video_dur = await get_duration(merged_video)
+    audio_dur = await get_duration(audio_path)
 
-    speed = 1.0
+    speed = pick_speed(video_dur, audio_dur)
     trim_end = audio_dur
 
-    if video_dur < audio_dur:
-        if video_dur * 1.2 >= audio_dur:
-            speed = 1.2
-        elif video_dur * 1.25 >= audio_dur:
-            speed = 1.25
-        else:
-            speed = 1.25
-
-    vf = f"setpts=PTS/{speed},trim=0:{trim_end},ass={ass_file}"
+    filter_complex, extra_outputs = split_outputs(
+        f"[0:v]setpts=PTS/{speed},trim=0:{trim_end}",
+        ass_file, 1, thumbnails_dir, preview_path
+    )
 
     cmd = [
         "ffmpeg", "-y",
         "-i", merged_video,
         "-i", audio_path,
-        "-filter_complex", f"[0:v]{vf}[v]",
+        "-filter_complex", filter_complex,
         "-map", "[v]",
         "-map", "1:a",
         "-c:v", "libx264",
@@ -215,19 +461,315 @@ def final_render(
         "-crf", "23",
         "-c:a", "aac",
         "-shortest",
-        output_path
+        *thread_args(threads),
+        output_path,
+        *extra_outputs
     ]
 
     print("🚀 Final render...")
-    run(cmd)
+    await run(cmd, output_path)
+
+    print(f"🎉 Final video created: {output_path}")
+    return True
+
+# ---------------------------------------------------------
+# Encode profiles: the production short, and a review draft
+# (same clips, audio and subtitles; subtitles are laid out on
+# the 1080x1920 PlayRes and scaled by libass, so they match)
+# ---------------------------------------------------------
+FINAL_PROFILE = {"width": 1080, "height": 1920, "fps": 30, "preset": "medium", "crf": 23}
+DRAFT_PROFILE = {"width": 540, "height": 960, "fps": 15, "preset": "veryfast", "crf": 30}
+
+
+# ---------------------------------------------------------
+# ONE PASS: clips → concat → speed/trim → subtitles + audio
+# (no merged intermediate, every frame encoded once)
+# ---------------------------------------------------------
+async def render_single_pass(
+    video_dir,
+    audio_path,
+    ass_file,
+    output_path,
+    width=1080,
+    height=1920,
+    fps=30,
+    threads=None,
+    preset="medium",
+    crf=23,
+    thumbnails_dir=None,
+    preview_path=None
+) -> bool:
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    if not os.path.exists(video_dir):
+        print(f"❌ Folder not found: {video_dir}")
+        return False
+
+    normalized = normalized_videos(video_dir)
+    videos = normalized or list_bg_videos(video_dir)
+
+    if not videos:
+        print("❌ No videos found")
+        return False
+
+    durations = [await get_duration(v) for v in videos]
+    audio_dur = await get_duration(audio_path)
+
+    if normalized:
+        # Planned clips cover the narration; if some never arrived,
+        # loop the ones we have rather than speeding them up
+        normalized = loop_to_cover(normalized, durations, audio_dur)
+        durations = loop_to_cover(durations, durations, audio_dur)
+
+    video_dur = sum(durations)
+
+    speed = pick_speed(video_dur, audio_dur)
+    trim_end = audio_dur
+
+    if normalized:
+        # Canonical clips are joined by the concat demuxer, no per-clip filters
+        list_file = write_concat_list(
+            normalized, os.path.join(video_dir, NORMALIZED_DIR, "concat.txt")
+        )
+        inputs = ["-f", "concat", "-safe", "0", "-i", list_file]
+        if (width, height, fps) == (1080, 1920, 30):
+            clips_filter = "[0:v]null[cat]"
+        else:
+            # Draft: shrink once, right after decode
+            clips_filter = f"[0:v]scale={width}:{height},fps={fps}[cat]"
+        audio_index = 1
+    else:
+        inputs = []
+        for v in videos:
+            inputs.extend(["-i", v])
+        clips_filter = concat_filter(len(videos), width, height, fps, "cat")
+        audio_index = len(videos)
+    inputs.extend(["-i", audio_path])
+
+    # One decode feeds the short and any thumbnail/preview outputs
+    graph, extra_outputs = split_outputs(
+        f"[cat]setpts=PTS/{speed},trim=0:{trim_end}",
+        ass_file, audio_index, thumbnails_dir, preview_path
+    )
+    filter_complex = clips_filter + ";" + graph
+
+    cmd = [
+        "ffmpeg", "-y",
+        *inputs,
+        "-filter_complex", filter_complex,
+        "-map", "[v]",
+        "-map", f"{audio_index}:a",
+        "-c:v", "libx264",
+        "-preset", preset,
+        "-crf", str(crf),
+        "-pix_fmt", "yuv420p",
+        "-r", str(fps),
+        "-c:a", "aac",
+        "-shortest",
+        *thread_args(threads),
+        output_path,
+        *extra_outputs
+    ]
+
+    print(f"🚀 Single-pass render of {len(videos)} clips...")
+    await run(cmd, output_path)
+
+    print(f"🎉 Final video created: {output_path}")
+    return True
+
+
+# ---------------------------------------------------------
+# SEGMENTED: split the normalized timeline at cut points snapped
+# to its real keyframes (planned clip lengths are fractional, so
+# even or whole-second points are not keyframes), encode the
+# segments in parallel, join by stream copy
+# ---------------------------------------------------------
+RENDER_SEGMENTS = int(os.getenv("RENDER_SEGMENTS", "0"))  # 0 → from core count
+MIN_SEGMENT = 4  # seconds
+
+
+async def timeline_keyframes(timeline, durations):
+    """
+    Keyframe times of the concatenated timeline, from each clip's cached
+    keyframe index shifted by the clips before it.
+    """
+    points = []
+    offset = 0.0
+    for video, duration in zip(timeline, durations):
+        points.extend(offset + t for t in await keyframes(video) if t < duration)
+        offset += duration
+    return points
+
+
+async def render_segmented(
+    video_dir,
+    audio_path,
+    ass_file,
+    output_path,
+    segments=RENDER_SEGMENTS,
+    fps=30,
+    threads=None,
+    thumbnails_dir=None
+) -> bool:
+    """
+    Only works on normalized clips, which all start on a keyframe.
+    Cut points are snapped to the timeline's actual keyframes: planned clip
+    lengths are rarely whole seconds, so each clip's 1s GOP grid starts at
+    a fractional timeline offset.
+    Each segment's encode also writes its own thumbnail candidates.
+    Falls back to render_single_pass otherwise.
+    """
+    normalized = normalized_videos(video_dir)
+    if not normalized:
+        print("⚠️ No normalized clips, falling back to single-pass render")
+        return await render_single_pass(
+            video_dir, audio_path, ass_file, output_path, threads=threads,
+            thumbnails_dir=thumbnails_dir
+        )
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    durations = [await get_duration(v) for v in normalized]
+    audio_dur = await get_duration(audio_path)
+    timeline = loop_to_cover(normalized, durations, audio_dur)
+    timeline_durations = loop_to_cover(durations, durations, audio_dur)
+
+    list_file = write_concat_list(
+        timeline, os.path.join(video_dir, NORMALIZED_DIR, "concat.txt")
+    )
+
+    # `threads` is this job's core budget (see render_scheduler)
+    cores = threads or os.cpu_count() or 1
+    if not segments:
+        segments = max(1, cores // 4)
+    segments = max(1, min(segments, int(audio_dur // MIN_SEGMENT)))
+
+    # Even split, each boundary moved to the nearest keyframe (left
+    # where it is when the clips report none)
+    cut_points = await timeline_keyframes(timeline, timeline_durations)
+    step = audio_dur / segments
+    starts = [0.0]
+    for i in range(1, segments):
+        cut = min(cut_points, key=lambda k: abs(k - i * step), default=i * step)
+        if starts[-1] < cut < audio_dur:
+            # Microseconds, ffmpeg's own precision: rounding any coarser
+            # can land just before the keyframe and seek a GOP back
+            starts.append(round(cut, 6))
+    segments = len(starts)
+    ends = starts[1:] + [audio_dur]
+    threads = max(1, cores // segments)
+
+    seg_dir = os.path.join(video_dir, "segments")
+    os.makedirs(seg_dir, exist_ok=True)
+
+    async def encode(index):
+        start, end = starts[index], ends[index]
+        seg_file = os.path.join(seg_dir, f"seg_{index:03d}.mp4")
+
+        # Shift PTS back to the timeline position so the ASS events line up,
+        # then restart at 0 for the segment file
+        graph, extra_outputs = split_outputs(
+            f"[0:v]setpts=PTS-STARTPTS+{start}/TB",
+            ass_file, None, thumbnails_dir,
+            prefix=f"thumb_{index:03d}", after=",setpts=PTS-STARTPTS"
+        )
+
+        cmd = [
+            "ffmpeg", "-y",
+            "-ss", str(start),
+            "-t", str(end - start),
+            "-f", "concat", "-safe", "0",
+            "-i", list_file,
+            "-filter_complex", graph,
+            "-map", "[v]",
+            "-an",
+            "-c:v", "libx264",
+            "-preset", "medium",
+            "-crf", "23",
+            "-pix_fmt", "yuv420p",
+            "-r", str(fps),
+            "-threads", str(threads),
+            seg_file,
+            *extra_outputs
+        ]
+        await run(cmd, seg_file)
+        return os.path.abspath(seg_file).replace("\\", "/")
+
+    print(f"🚀 Segmented render: {segments} segments × {threads} threads...")
+    # Cancelling the render (or one failed segment) kills every segment's
+    # ffmpeg before this returns
+    seg_files = await gather_all(*(encode(i) for i in range(segments)))
+
+    seg_list = write_concat_list(seg_files, os.path.join(seg_dir, "concat.txt"))
+
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "concat", "-safe", "0",
+        "-i", seg_list,
+        "-i", audio_path,
+        "-map", "0:v",
+        "-map", "1:a",
+        "-c:v", "copy",
+        "-c:a", "aac",
+        "-shortest",
+        "-movflags", "+faststart",
+        output_path
+    ]
+    await run(cmd, output_path)
 
     print(f"🎉 Final video created: {output_path}")
     return True
 
-def final_videos(content_id,merged_videos_path,ass_files,final_name,bg_root,audio_root):
+
+async def ensure_subtitles(audio_root, ass_files, use_whisper=False) -> bool:
+    """
+    generate_audio writes the subtitles from edge-tts word boundaries;
+    Whisper only runs when asked to or when that file is missing, and a
+    cached transcript of the same audio is reused.
+    render_scheduler calls this in the parent process, so the pool
+    processes never load a model of their own.
+    """
+    if not use_whisper and os.path.exists(ass_files):
+        return True
+
+    # Cache entries are labelled with the model that transcribes them
+    whisper = {"whisper_model": WHISPER_MODEL, "backend": WHISPER_BACKEND}
+    if os.path.exists(audio_root):
+        cached_words = get_transcript(audio_root, **whisper)
+        if cached_words is not None:
+            print("♻️ Whisper transcript cache hit")
+            write_ass_subtitles(cached_words, ass_files)
+            return True
+
+    return await generate_ass_subtitles(audio_root, ass_files, **whisper)
+
+
+async def final_videos(content_id,merged_videos_path,ass_files,final_name,bg_root,audio_root,use_whisper=False,single_pass=True,segmented=False,threads=None,draft=False,thumbnails_dir=None,preview_path=None) -> bool:
+    """
+    `draft=True` renders DRAFT_PROFILE from the same clips, audio and
+    subtitles; rendering again without it promotes that plan to the full
+    short with nothing refetched or retranscribed.
+    `thumbnails_dir` adds scored thumbnail candidates to every full render,
+    `preview_path` a preview to the single-pass and two-pass ones (see
+    split_outputs).
+    Returns False when there was nothing to render.
+    """
     print(f"====Processing conent {content_id}==== ")
-    merge_bg_videos(bg_root,merged_videos_path)
-    generate_ass_subtitles(audio_root,ass_files)
-    final_render(merged_videos_path,audio_root,ass_files,final_name)
 
+    if thumbnails_dir and not draft:
+        reset_thumbnails(thumbnails_dir)
+
+    subtitles = ensure_subtitles(audio_root, ass_files, use_whisper)
+
+    if draft:
+        return await subtitles and await render_single_pass(bg_root,audio_root,ass_files,final_name,threads=threads,**DRAFT_PROFILE)
+
+    if segmented:
+        return await subtitles and await render_segmented(bg_root,audio_root,ass_files,final_name,threads=threads,thumbnails_dir=thumbnails_dir)
+
+    if single_pass:
+        return await subtitles and await render_single_pass(bg_root,audio_root,ass_files,final_name,threads=threads,thumbnails_dir=thumbnails_dir,preview_path=preview_path)
 
+    # Transcription (if any) runs while ffmpeg merges the clips
+    merged, subtitled = await gather_all(merge_bg_videos(bg_root,merged_videos_path), subtitles)
+    return merged and subtitled and await final_render(merged_videos_path,audio_root,ass_files,final_name,threads=threads,thumbnails_dir=thumbnails_dir,preview_path=preview_path)
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from helper import file_sha256
+
+# What each item has finished, kept next to the work folders
+MANIFEST_PATH = os.getenv("RUN_MANIFEST", "run_manifest")
+LOCK_STALE = 30  # seconds before a left-over lock file is broken
+
+
+class RunManifest:
+    """
+    Per item and per stage, the outputs a stage produced (with size and
+    sha256) plus any extra facts such as the YouTube video ID, one file
+    per item in the `path` folder:
+    {content_id}.json: {stage: {"outputs": {path: {"size", "sha256"}}, "at", ...}}
+    Saved atomically after every record, so a crash loses at most the
+    stage that was running. Workers on any host sharing the folder (see
+    worker.py) only rewrite the file of the item they hold, under an
+    O_EXCL lock file (atomic on NFSv3+ too), and read it afresh each
+    time, so no cached copy of a whole-run file can undo another host's
+    records.
+    """
+
+    def __init__(self, path=MANIFEST_PATH, reset=False):
+        self.path = path
+        self.lock = threading.Lock()
+
+        if reset and os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+
+    def _item_path(self, content_id):
+        return os.path.join(self.path, f"{content_id}.json")
+
+    @contextmanager
+    def _file_lock(self, path):
+        lock_path = f"{path}.lock"
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > LOCK_STALE:
+                        os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
+
+    def _load(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, path, stages):
+        part = f"{path}.part"
+        with open(part, "w", encoding="utf-8") as f:
+            json.dump(stages, f, indent=2)
+        os.replace(part, path)
+
+    def record(self, content_id, stage, outputs=(), **extra):
+        entry = {
+            "outputs": {
+                path: {"size": os.path.getsize(path), "sha256": file_sha256(path)}
+                for path in outputs
+            },
+            "at": time.time(),
+            **extra,
+        }
+
+        path = self._item_path(content_id)
+        with self.lock, self._file_lock(path):
+            stages = self._load(path)
+            stages[stage] = entry
+            self._save(path, stages)
+
+    def get(self, content_id, stage):
+        return self._load(self._item_path(content_id)).get(stage)
+
+    def done(self, content_id, stage) -> bool:
+        """
+        True if the stage was recorded and every output it produced is
+        still on disk, unchanged.
+        """
+        entry = self.get(content_id, stage)
+        if entry is None:
+            return False
+
+        for path, meta in entry["outputs"].items():
+            if not os.path.exists(path) or os.path.getsize(path) != meta["size"]:
+                return False
+            if file_sha256(path) != meta["sha256"]:
+                return False
+
+        return True
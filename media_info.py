@@ -0,0 +1,192 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from helper import CACHE_DIR
+from media_runner import FFPROBE_TIMEOUT, run_media
+
+# Probe results keyed by (path, size, mtime): each file is probed once,
+# in memory for this process and on disk for every later one.
+MEDIA_INFO_PATH = os.getenv("MEDIA_INFO_PATH", os.path.join(CACHE_DIR, "media_info.db"))
+
+_memory = {}
+_lock = threading.Lock()
+
+
+class InvalidMedia(RuntimeError):
+    pass
+
+
+# ---------------------------------------------------------
+# Utility: on-disk cache connection (one per call)
+# ---------------------------------------------------------
+@contextmanager
+def _connect():
+    dirname = os.path.dirname(MEDIA_INFO_PATH)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    conn = sqlite3.connect(MEDIA_INFO_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS media_info (
+            path   TEXT NOT NULL,
+            size   INTEGER NOT NULL,
+            mtime  INTEGER NOT NULL,
+            kind   TEXT NOT NULL,
+            data   TEXT NOT NULL,
+            PRIMARY KEY (path, size, mtime, kind)
+        )
+    """)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _file_key(path):
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+# _lock only guards _memory: SQLite (which may wait up to 30s on other
+# processes) runs in a thread, so the event loop never waits on it
+def _disk_get(key, kind):
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT data FROM media_info WHERE path = ? AND size = ? AND mtime = ? AND kind = ?",
+            (*key, kind)
+        ).fetchone()
+    return None if row is None else json.loads(row[0])
+
+
+def _disk_put(key, kind, data):
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO media_info VALUES (?, ?, ?, ?, ?)",
+            (*key, kind, json.dumps(data))
+        )
+
+
+async def _cache_get(key, kind):
+    with _lock:
+        if (key, kind) in _memory:
+            return _memory[(key, kind)]
+    data = await asyncio.to_thread(_disk_get, key, kind)
+    if data is not None:
+        with _lock:
+            _memory[(key, kind)] = data
+    return data
+
+
+async def _cache_put(key, kind, data):
+    with _lock:
+        _memory[(key, kind)] = data
+    await asyncio.to_thread(_disk_put, key, kind, data)
+
+
+def _rate(value):
+    num, _, den = (value or "0/0").partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+async def probe(path, timeout=FFPROBE_TIMEOUT) -> dict:
+    """
+    {"duration", "width", "height", "fps", "codec", "pix_fmt",
+     "has_video", "has_audio", "size"} from a single ffprobe call.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        raise InvalidMedia(f"Empty or missing file: {path}")
+
+    key = _file_key(path)
+    info = await _cache_get(key, "probe")
+    if info is not None:
+        return info
+
+    try:
+        out = await run_media(
+            [
+                "ffprobe", "-v", "error",
+                "-show_format", "-show_streams",
+                "-of", "json",
+                path
+            ],
+            timeout=timeout
+        )
+    except RuntimeError as e:
+        raise InvalidMedia(f"Unreadable media {path}: {e}") from e
+
+    data = json.loads(out)
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+
+    info = {
+        "duration": float(fmt.get("duration") or video.get("duration") or 0),
+        "width": video.get("width", 0),
+        "height": video.get("height", 0),
+        "fps": _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate")),
+        "codec": video.get("codec_name"),
+        "pix_fmt": video.get("pix_fmt"),
+        "has_video": bool(video),
+        "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+        "size": key[1],
+    }
+
+    await _cache_put(key, "probe", info)
+    return info
+
+
+async def keyframes(path, timeout=FFPROBE_TIMEOUT) -> list:
+    """
+    Keyframe timestamps (seconds) of the first video stream, read from
+    packet flags so nothing is decoded.
+    """
+    key = _file_key(path)
+    times = await _cache_get(key, "keyframes")
+    if times is not None:
+        return times
+
+    out = await run_media(
+        [
+            "ffprobe", "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "json",
+            path
+        ],
+        timeout=timeout
+    )
+
+    times = sorted(
+        float(p["pts_time"])
+        for p in json.loads(out).get("packets", [])
+        if "K" in p.get("flags", "") and p.get("pts_time") not in (None, "N/A")
+    )
+
+    await _cache_put(key, "keyframes", times)
+    return times
+
+
+async def validate_clip(path, min_duration=1.0) -> dict:
+    """
+    Fail fast on corrupt, empty, audio-only or too-short downloads,
+    before any CPU is spent encoding them.
+    """
+    info = await probe(path)
+
+    if not info["has_video"] or not info["width"] or not info["height"]:
+        raise InvalidMedia(f"No video stream in {path}")
+    if info["duration"] < min_duration:
+        raise InvalidMedia(f"Clip too short ({info['duration']:.1f}s): {path}")
+
+    return info
+
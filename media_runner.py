@@ -0,0 +1,156 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+# Per-command limits; a hung ffmpeg is killed instead of stalling the run
+FFMPEG_TIMEOUT = float(os.getenv("FFMPEG_TIMEOUT", "1800"))
+FFPROBE_TIMEOUT = float(os.getenv("FFPROBE_TIMEOUT", "60"))
+STDERR_LIMIT = 64 * 1024
+PROGRESS_INTERVAL = 5.0
+
+
+class MediaError(RuntimeError):
+    def __init__(self, cmd, returncode, stderr):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stderr = stderr
+        super().__init__(
+            f"{os.path.basename(cmd[0])} exited with {returncode}: {stderr.strip()[-2000:]}"
+        )
+
+
+class MediaTimeout(MediaError):
+    def __init__(self, cmd, timeout, stderr):
+        self.cmd = cmd
+        self.returncode = None
+        self.stderr = stderr
+        self.timeout = timeout
+        RuntimeError.__init__(
+            self, f"{os.path.basename(cmd[0])} timed out after {timeout:.0f}s"
+        )
+
+
+# ---------------------------------------------------------
+# Utility: keep only the last `limit` bytes of stderr
+# ---------------------------------------------------------
+async def _drain_stderr(stream, tail, limit):
+    size = 0
+    async for line in stream:
+        tail.append(line)
+        size += len(line)
+        while size > limit and len(tail) > 1:
+            size -= len(tail.popleft())
+
+
+def _number(value):
+    # ffmpeg reports "N/A" until it has a value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------------------------------------------------
+# Utility: `-progress pipe:1` key=value blocks → callbacks
+# ---------------------------------------------------------
+async def _read_progress(stream, on_progress):
+    block = {}
+    async for raw in stream:
+        key, _, value = raw.decode(errors="replace").strip().partition("=")
+        if not key:
+            continue
+        block[key] = value
+
+        if key == "progress":
+            if on_progress:
+                on_progress({
+                    "frame": int(block.get("frame", 0) or 0),
+                    "fps": _number(block.get("fps")) or 0.0,
+                    "speed": _number(block.get("speed", "").rstrip("x")),
+                    "out_time": block.get("out_time"),
+                    "done": value == "end",
+                })
+            block = {}
+
+
+def print_progress(label):
+    """
+    Progress callback printing at most every PROGRESS_INTERVAL seconds.
+    """
+    last = [0.0]
+
+    def report(p):
+        now = time.monotonic()
+        if p["done"] or now - last[0] >= PROGRESS_INTERVAL:
+            last[0] = now
+            speed = f"{p['speed']:.2f}x" if p["speed"] else "?"
+            print(f"📈 {label}: frame={p['frame']} fps={p['fps']:.1f} speed={speed}")
+
+    return report
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+async def run_media(cmd, timeout=FFMPEG_TIMEOUT, on_progress=None, stderr_limit=STDERR_LIMIT) -> str:
+    """
+    Run ffmpeg/ffprobe without blocking the event loop.
+    ffmpeg commands get `-progress pipe:1 -nostats` and report through
+    `on_progress`; other commands return their stdout.
+    Cancellation or timeout kills the process. Non-zero exit → MediaError
+    carrying the last `stderr_limit` bytes of stderr.
+    """
+    is_ffmpeg = os.path.basename(cmd[0]) == "ffmpeg"
+    if is_ffmpeg:
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    tail = deque()
+    stdout_chunks = []
+
+    async def read_stdout():
+        if is_ffmpeg:
+            await _read_progress(proc.stdout, on_progress)
+        else:
+            stdout_chunks.append(await proc.stdout.read())
+
+    tasks = [
+        asyncio.ensure_future(read_stdout()),
+        asyncio.ensure_future(_drain_stderr(proc.stderr, tail, stderr_limit)),
+        asyncio.ensure_future(proc.wait()),
+    ]
+
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+    except BaseException:
+        # Cancelled while running: never leave ffmpeg behind
+        await _kill(proc, tasks)
+        raise
+
+    if pending:
+        await _kill(proc, tasks)
+        raise MediaTimeout(cmd, timeout, b"".join(tail).decode(errors="replace"))
+
+    for task in tasks:
+        task.result()
+
+    if proc.returncode != 0:
+        raise MediaError(cmd, proc.returncode, b"".join(tail).decode(errors="replace"))
+
+    return b"".join(stdout_chunks).decode(errors="replace")
+
+
+async def _kill(proc, tasks):
+    if proc.returncode is None:
+        proc.kill()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await proc.wait()
@@ -0,0 +1,88 @@
+import asyncio
+import os
+
+# Per-stage concurrency: network (TTS + clip fetch), uplink. Renders are
+# sized by render_scheduler.thread_budget (RENDER_WORKERS)
+PREPARE_CONCURRENCY = int(os.getenv("PREPARE_CONCURRENCY", "3"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "3"))
+# Items allowed to wait between two stages before upstream pauses
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+
+_DONE = object()
+
+
+# Bounded queue that knows how many workers drain it
+class _Queue(asyncio.Queue):
+    def __init__(self, maxsize, workers):
+        super().__init__(maxsize)
+        self.workers = workers
+
+
+# ---------------------------------------------------------
+# One stage: `workers` coroutines pulling from `inbox`
+# ---------------------------------------------------------
+async def _stage(name, func, inbox, outbox, workers, results):
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+
+            key = item["id"]
+            try:
+                await func(item)
+            except Exception as e:
+                results[key] = {"stage": name, "ok": False, "error": str(e) or type(e).__name__}
+                print(f"❌ {name} failed for ID {key}: {results[key]['error']}")
+                continue
+
+            results[key] = {"stage": name, "ok": True}
+            if outbox is not None:
+                # Blocks while the next stage is saturated (backpressure)
+                await outbox.put(item)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+    # Every worker of this stage is done: release the next stage
+    if outbox is not None:
+        for _ in range(outbox.workers):
+            await outbox.put(_DONE)
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+async def run_pipeline(
+    items,
+    prepare,
+    render,
+    upload,
+    prepare_workers=PREPARE_CONCURRENCY,
+    render_workers=1,
+    upload_workers=UPLOAD_CONCURRENCY,
+    queue_size=QUEUE_SIZE
+) -> dict:
+    """
+    Stream items through prepare → render → upload (async callables taking
+    the item dict), so item N uploads while N+1 renders and N+2 fetches.
+    Each stage has its own worker count; bounded queues keep fast stages
+    from running far ahead. A failed item drops out at that stage only.
+    Returns {item id: {"stage", "ok", "error"?}} for the last stage reached.
+    """
+    inbox = _Queue(0, prepare_workers)
+    to_render = _Queue(queue_size, render_workers)
+    to_upload = _Queue(queue_size, upload_workers)
+    results = {}
+
+    for item in items:
+        inbox.put_nowait(item)
+    for _ in range(prepare_workers):
+        inbox.put_nowait(_DONE)
+
+    await asyncio.gather(
+        _stage("prepare", prepare, inbox, to_render, prepare_workers, results),
+        _stage("render", render, to_render, to_upload, render_workers, results),
+        _stage("upload", upload, to_upload, None, upload_workers, results),
+    )
+
+    return results
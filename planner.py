@@ -0,0 +1,54 @@
+import math
+
+# Stock clips are searched in the 10–15s range (see generate_bg),
+# so any slot up to MIN_CLIP seconds fits inside every candidate.
+MIN_CLIP = 10
+
+
+# ---------------------------------------------------------
+# Plan: how many clips, and which range of each, to cover
+# the narration exactly once
+# ---------------------------------------------------------
+def plan_clips(audio_duration, keywords, min_clip=MIN_CLIP) -> list:
+    """
+    Split the narration into equal slots no longer than `min_clip`, one
+    clip per slot, cycling through the item's keywords (a keyword that
+    comes round again gets a different clip, see
+    generate_bg.download_bg_videos). Each entry is
+    {"keyword", "start", "duration"}; only that range gets normalized and
+    encoded, so nothing is rendered just to be trimmed away.
+    """
+    if not keywords:
+        return []
+
+    count = max(1, math.ceil(audio_duration / min_clip))
+    slot = audio_duration / count
+
+    return [
+        {
+            "keyword": keywords[i % len(keywords)],
+            "start": 0.0,
+            "duration": slot,
+        }
+        for i in range(count)
+    ]
+
+
+# ---------------------------------------------------------
+# Loop: repeat clips (instead of speeding them up) when
+# fewer clips arrived than the plan asked for
+# ---------------------------------------------------------
+def loop_to_cover(videos, durations, target) -> list:
+    if not videos or sum(durations) <= 0:
+        return list(videos)
+
+    sequence = []
+    covered = 0.0
+    i = 0
+
+    while covered < target:
+        sequence.append(videos[i % len(videos)])
+        covered += durations[i % len(videos)]
+        i += 1
+
+    return sequence
@@ -0,0 +1,28 @@
+import argparse
+from datetime import date, timedelta
+from content_store import iter_items
+from generate_bg import prefetch_search_index
+
+
+# ---------------------------------------------------------
+# Prefetch stock-footage search results for upcoming days
+#   python prefetch.py --start 2026-02-04 --days 14
+# ---------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch stock-footage search results")
+    parser.add_argument("--start", default=date.today().isoformat())
+    parser.add_argument("--days", type=int, default=14)
+    args = parser.parse_args()
+
+    end = (date.fromisoformat(args.start) + timedelta(days=args.days - 1)).isoformat()
+    rows = list(iter_items(args.start, end))
+
+    keywords = [bg for row in rows for bg in row.get("bg_vedios", [])]
+    print(f"🔎 {len(rows)} rows, {len(set(keywords))} keywords ({args.start} → {end})")
+
+    searched = prefetch_search_index(keywords)
+    print(f"✅ Search index refreshed ({searched} searches)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from make_videos import ensure_subtitles, final_videos
+
+# Renders running at once; 0 → one per 4 cores
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
+# Clip normalizations (prepare stage) encoding at once while renders run;
+# their threads come out of the same core budget
+NORMALIZE_WORKERS = int(os.getenv("NORMALIZE_WORKERS", "1"))
+
+
+# ---------------------------------------------------------
+# One render job: awaited directly (worker.py), or run in a
+# pool process through render_job()
+# ---------------------------------------------------------
+async def render_one(job, threads=None) -> float:
+    start = time.monotonic()
+
+    # A file left by an earlier run must never pass for this render
+    if os.path.exists(job["final_name"]):
+        os.remove(job["final_name"])
+
+    if not await final_videos(**job, threads=threads):
+        raise RuntimeError(f"Nothing rendered for {job['content_id']}")
+    if not os.path.exists(job["final_name"]):
+        raise RuntimeError(f"{job['final_name']} was not produced")
+
+    return time.monotonic() - start
+
+
+def render_job(job, threads):
+    # Process-pool entry point: the render's own event loop
+    return asyncio.run(render_one(job, threads))
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+def thread_budget(workers=RENDER_WORKERS, jobs=None, reserve=0):
+    """
+    (workers, ffmpeg threads per job) that pack renders onto the cores,
+    leaving a job's share to each of `reserve` other encodes (e.g.
+    NORMALIZE_WORKERS while clips are fetched alongside).
+    """
+    cores = os.cpu_count() or 1
+    workers = workers or max(1, cores // 4)
+    if jobs:
+        workers = min(workers, jobs)
+    return workers, max(1, cores // (workers + reserve))
+
+
+def process_pool(workers):
+    """
+    ProcessPoolExecutor whose processes start clean (forkserver, or spawn
+    where there is none) instead of forking this process mid-run, with its
+    threads, held locks and loaded models. Create it before starting threads.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context(method)
+    )
+
+
+def render_batch(jobs, workers=RENDER_WORKERS, **options) -> list:
+    """
+    Render many final_videos() jobs (dicts of its arguments) on a process
+    pool, each ffmpeg limited to its share of the cores.
+    A failing job never stops the others; returns one result per job, in
+    order: {"content_id", "ok", "output", "seconds" | "error"}.
+    `options` (e.g. segmented=True) are passed to every job.
+    Missing subtitles are transcribed here, on this process's one warm
+    Whisper model, while earlier jobs render; pool processes only encode.
+    """
+    if not jobs:
+        return []
+
+    workers, threads = thread_budget(workers, len(jobs))
+
+    print(f"🗂️ Rendering {len(jobs)} videos: {workers} workers × {threads} threads")
+
+    results = [None] * len(jobs)
+
+    def failed(job, e):
+        result = {
+            "content_id": job["content_id"],
+            "output": job["final_name"],
+            "ok": False,
+            "error": str(e) or type(e).__name__,
+        }
+        print(f"❌ Render failed for {job['content_id']}: {result['error']}")
+        return result
+
+    with process_pool(workers) as pool:
+        futures = {}
+        for i, job in enumerate(jobs):
+            job = {**job, **options}
+            try:
+                if not asyncio.run(ensure_subtitles(
+                    job["audio_root"], job["ass_files"], job.pop("use_whisper", False)
+                )):
+                    raise RuntimeError(f"No subtitles for {job['content_id']}")
+            except Exception as e:
+                results[i] = failed(job, e)
+                continue
+            futures[pool.submit(render_job, job, threads)] = i
+
+        for future in as_completed(futures):
+            i = futures[future]
+            job = jobs[i]
+
+            try:
+                seconds = future.result()
+            except Exception as e:
+                results[i] = failed(job, e)
+                continue
+
+            results[i] = {
+                "content_id": job["content_id"],
+                "output": job["final_name"],
+                "ok": True,
+                "seconds": seconds,
+            }
+            print(f"✅ Rendered {job['content_id']} in {seconds:.1f}s")
+
+    return results
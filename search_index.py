@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from helper import CACHE_DIR
+
+# Local store of provider search results, so picking a clip on render day
+# is an indexed query instead of a live search round-trip.
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(CACHE_DIR, "search_index.db"))
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL_DAYS", "7")) * 24 * 3600
+
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# Utility: index connection (one per call, thread safe)
+# ---------------------------------------------------------
+@contextmanager
+def _connect():
+    dirname = os.path.dirname(SEARCH_INDEX_PATH)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    conn = sqlite3.connect(SEARCH_INDEX_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS searches (
+            provider    TEXT NOT NULL,
+            keyword     TEXT NOT NULL,
+            fetched_at  REAL NOT NULL,
+            PRIMARY KEY (provider, keyword)
+        );
+        CREATE TABLE IF NOT EXISTS renditions (
+            provider    TEXT NOT NULL,
+            keyword     TEXT NOT NULL,
+            video_id    TEXT NOT NULL,
+            duration    REAL NOT NULL,
+            width       INTEGER NOT NULL,
+            height      INTEGER NOT NULL,
+            url         TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS renditions_lookup
+            ON renditions (provider, keyword, duration);
+    """)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _normalize_keyword(keyword: str) -> str:
+    return " ".join(keyword.lower().split())
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+def is_fresh(provider: str, keyword: str, ttl: float = SEARCH_INDEX_TTL) -> bool:
+    with _lock, _connect() as conn:
+        row = conn.execute(
+            "SELECT fetched_at FROM searches WHERE provider = ? AND keyword = ?",
+            (provider, _normalize_keyword(keyword))
+        ).fetchone()
+    return row is not None and time.time() - row["fetched_at"] < ttl
+
+
+def store(provider: str, keyword: str, results: list):
+    """
+    Replace the stored results for (provider, keyword).
+    `results` holds one dict per rendition:
+    {"video_id", "duration", "width", "height", "url"}.
+    """
+    keyword = _normalize_keyword(keyword)
+
+    with _lock, _connect() as conn:
+        conn.execute(
+            "DELETE FROM renditions WHERE provider = ? AND keyword = ?",
+            (provider, keyword)
+        )
+        conn.executemany(
+            "INSERT INTO renditions VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    provider,
+                    keyword,
+                    r["video_id"],
+                    r["duration"],
+                    r["width"],
+                    r["height"],
+                    r["url"],
+                )
+                for r in results
+            ]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO searches VALUES (?, ?, ?)",
+            (provider, keyword, time.time())
+        )
+
+
+def query(provider, keyword, min_duration, max_duration, max_width) -> list:
+    """
+    Vertical renditions within the duration range and width limit.
+    """
+    with _lock, _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT video_id, duration, width, height, url FROM renditions
+            WHERE provider = ? AND keyword = ?
+              AND duration BETWEEN ? AND ?
+              AND height > width AND width <= ?
+            """,
+            (provider, _normalize_keyword(keyword), min_duration, max_duration, max_width)
+        ).fetchall()
+    return [dict(row) for row in rows]
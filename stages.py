@@ -0,0 +1,238 @@
+import os
+import asyncio
+import shutil
+import weakref
+from datetime import datetime, timedelta, timezone
+from content_store import iter_items
+from generate_audio import generate_audio
+from helper import get_video_paths
+from make_videos import normalize_clip, pick_thumbnail
+from media_info import probe
+from planner import plan_clips
+from render_scheduler import NORMALIZE_WORKERS
+
+# Work folders, relative to the run's (possibly shared) root
+AUDIO_DIR = "audio"
+VIDEOS_DIR = "final_videos"
+SUBTITLE_DIR = "subtitles"
+BG_VIDEOS = 'videos'
+WORK_DIRS = [AUDIO_DIR, VIDEOS_DIR, SUBTITLE_DIR, BG_VIDEOS]
+# Also write a small low-bitrate preview next to each short
+RENDER_PREVIEW = os.getenv("RENDER_PREVIEW", "0") == "1"
+
+# Per event loop: how many clip normalizations encode at once, across
+# all items being prepared (the network stage must not eat render cores)
+_normalize_slots = weakref.WeakKeyDictionary()
+
+
+def _normalize_slot():
+    loop = asyncio.get_running_loop()
+    if loop not in _normalize_slots:
+        _normalize_slots[loop] = asyncio.Semaphore(NORMALIZE_WORKERS)
+    return _normalize_slots[loop]
+
+
+def item_paths(content_id):
+    return {
+        "audio": os.path.join(AUDIO_DIR, f"audio_{content_id}.mp3"),
+        "subtitles": os.path.join(SUBTITLE_DIR, f"tiktok_style_{content_id}.ass"),
+        "clips": os.path.join(BG_VIDEOS, str(content_id)),
+        "merged": os.path.join(VIDEOS_DIR, f"merged_{content_id}.mp4"),
+        "final": os.path.join(VIDEOS_DIR, f"shorts_{content_id}.mp4"),
+        "draft": os.path.join(VIDEOS_DIR, f"draft_{content_id}.mp4"),
+        "thumbnails": os.path.join(VIDEOS_DIR, f"thumbs_{content_id}"),
+        "preview": os.path.join(VIDEOS_DIR, f"preview_{content_id}.mp4"),
+    }
+
+
+def has_content(item):
+    return bool(item.get("content", "").strip())
+
+
+# ---------------------------------------------------------
+# Cleanup: an item's work files go only once it is uploaded
+# ---------------------------------------------------------
+def cleanup_item(content_id):
+    for path in item_paths(content_id).values():
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    print(f"Deleted work files of ID {content_id}")
+
+
+# ---------------------------------------------------------
+# Schedule: each item's publishAt comes from its own date,
+# the day's items spread evenly from midnight UTC
+# ---------------------------------------------------------
+def publish_times(items) -> dict:
+    TOTAL_MINUTES = 24 * 60  # 1440
+    times = {}
+
+    for day in sorted({item["date"] for item in items}):
+        # Slots follow the CSV order of the whole day, whatever order
+        # (or run, or worker) items finish in
+        day_items = [item for item in iter_items(day) if has_content(item)]
+        gap_minutes = TOTAL_MINUTES // len(day_items)
+        start_time = datetime.fromisoformat(day).replace(tzinfo=timezone.utc)
+
+        for index, item in enumerate(day_items):
+            times[item["id"]] = (
+                start_time + timedelta(minutes=index * gap_minutes)
+            ).isoformat(timespec="seconds")
+
+    return times
+
+
+# ---------------------------------------------------------
+# TTS: narration + subtitles from edge-tts word boundaries
+# ---------------------------------------------------------
+async def tts_item(item, manifest):
+    content_id = item["id"]
+    paths = item_paths(content_id)
+    audio_path = paths["audio"]
+    ass_path = paths["subtitles"]
+
+    for folder in (AUDIO_DIR, SUBTITLE_DIR):
+        os.makedirs(folder, exist_ok=True)
+
+    if manifest.done(content_id, "audio"):
+        print(f"Audio already done for ID {content_id}")
+        return
+
+    await generate_audio(
+        text=item["content"].strip(),
+        output_file=audio_path,
+        voice="en-US-JennyNeural",
+        subtitle_file=ass_path
+    )
+    print(f"Audio generated for ID {content_id}")
+    manifest.record(
+        content_id, "audio",
+        [p for p in (audio_path, ass_path) if os.path.exists(p)]
+    )
+
+
+# ---------------------------------------------------------
+# FETCH: the planned clips, normalized as they land
+# ---------------------------------------------------------
+async def fetch_item(item, manifest, threads=None):
+    # requests is only loaded by stages that download
+    from generate_bg import download_bg_videos
+
+    content_id = item["id"]
+    audio_path = item_paths(content_id)["audio"]
+
+    if manifest.done(content_id, "clips"):
+        print(f"Clips already done for ID {content_id}")
+        return
+
+    # The narration length decides how many clips (and which range
+    # of each) get downloaded, normalized and encoded
+    audio_info = await probe(audio_path)
+    plan = plan_clips(audio_info["duration"], item.get("bg_vedios", []))
+    video_paths = get_video_paths(content_id, len(plan))
+    ranges = dict(zip(video_paths, plan))
+
+    # `threads` is a render job's share of the cores (see thread_budget)
+    async def normalize(path):
+        async with _normalize_slot():
+            return await normalize_clip(
+                path,
+                start=ranges[path]["start"],
+                duration=ranges[path]["duration"],
+                threads=threads
+            )
+
+    downloaded = await download_bg_videos(
+        [(p["keyword"], path) for p, path in zip(plan, video_paths)],
+        on_downloaded=normalize
+    )
+
+    clips = [path for path in downloaded if path]
+    for path in clips:
+        print(f"Downloaded {path}")
+
+    if not clips:
+        raise RuntimeError(f"No background clips for ID {content_id}")
+    manifest.record(content_id, "clips", clips)
+
+
+# ---------------------------------------------------------
+# PREPARE: the network half of an item (TTS, then clips)
+# ---------------------------------------------------------
+async def prepare_item(item, manifest, threads=None):
+    await tts_item(item, manifest)
+    await fetch_item(item, manifest, threads)
+
+
+# ---------------------------------------------------------
+# RENDER: final_videos() arguments for one item, and what
+# a finished render leaves behind. A draft is the same job
+# at review quality, written next to the final short.
+# ---------------------------------------------------------
+def render_job(content_id, draft=False, preview=RENDER_PREVIEW):
+    paths = item_paths(content_id)
+    job = {
+        "content_id": content_id,
+        "merged_videos_path": paths["merged"],
+        "ass_files": paths["subtitles"],
+        "final_name": paths["draft"] if draft else paths["final"],
+        "bg_root": paths["clips"],
+        "audio_root": paths["audio"],
+    }
+    if draft:
+        job["draft"] = True
+    else:
+        # Thumbnail candidates (and the preview) come out of the same decode
+        job["thumbnails_dir"] = paths["thumbnails"]
+        if preview:
+            job["preview_path"] = paths["preview"]
+    return job
+
+
+def record_render(manifest, job):
+    manifest.record(
+        job["content_id"], "draft" if job.get("draft") else "render",
+        [
+            p for p in (job["final_name"], job["ass_files"], job["merged_videos_path"], job.get("preview_path"))
+            if p and os.path.exists(p)
+        ]
+    )
+
+
+# ---------------------------------------------------------
+# UPLOAD: blocking, run it in a thread (helper.run_in_thread
+# passes `stop`, so a cancelled upload ends between chunks)
+# ---------------------------------------------------------
+def upload_item(uploader, item, manifest, publish_at, stop=None):
+    content_id = item["id"]
+    title = item.get("title")
+    description = item.get("description")
+    tags = item.get("tags")
+    hashtags = " ".join(
+        tag.strip() if tag.strip().startswith("#") else f"#{tag.strip()}"
+        for tag in tags
+        if tag.strip()
+    )
+    final_description = description.strip()
+    if hashtags:
+        final_description += "\n\n" + hashtags
+
+    keywords = item.get("keywords")
+    vedio_path = item_paths(content_id)["final"]
+
+    yt_upload = uploader.upload(vedio_path, title, final_description, keywords, publish_at, stop=stop)
+    print(yt_upload)
+
+    manifest.record(content_id, "upload", video_id=yt_upload["id"])
+
+    thumbnail = pick_thumbnail(item_paths(content_id)["thumbnails"])
+    if thumbnail:
+        # Custom thumbnails need a verified channel: never fail the upload
+        try:
+            uploader.set_thumbnail(yt_upload["id"], thumbnail)
+        except Exception as e:
+            print(f"⚠️ Thumbnail not set for {yt_upload['id']}: {e}")
+
+    return yt_upload["id"]
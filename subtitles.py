@@ -0,0 +1,57 @@
+import os
+
+
+ASS_HEADER = """[Script Info]
+Title: TikTok Style
+ScriptType: v4.00+
+PlayResX: 1080
+PlayResY: 1920
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, OutlineColour, BackColour, Bold, Italic, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV
+Style: Default,Arial Black,80,&H0000FFFF,&H00000000,&H80000000,-1,0,1,4,0,5,10,10,80
+
+[Events]
+Format: Layer, Start, End, Style, Text
+"""
+
+
+# ---------------------------------------------------------
+# Utility: seconds → ASS timestamp (h:mm:ss.cc)
+# ---------------------------------------------------------
+def ass_time(t):
+    h = int(t // 3600)
+    m = int((t % 3600) // 60)
+    s = int(t % 60)
+    cs = int((t % 1) * 100)
+    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+
+
+# ---------------------------------------------------------
+# Word timings → ASS subtitles (word-by-word)
+# ---------------------------------------------------------
+def write_ass_subtitles(words, ass_file) -> int:
+    """
+    `words` is a list of {"word", "start", "end"} dicts with times in seconds,
+    as produced by edge-tts WordBoundary events or by Whisper.
+    """
+    dirname = os.path.dirname(ass_file)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+
+    ass = ASS_HEADER
+
+    word_count = 0
+    for w in words:
+        ass += (
+            f"Dialogue: 0,"
+            f"{ass_time(w['start'])},"
+            f"{ass_time(w['end'])},"
+            f"Default,{w['word'].strip()}\n"
+        )
+        word_count += 1
+
+    with open(ass_file, "w", encoding="utf-8") as f:
+        f.write(ass)
+
+    return word_count
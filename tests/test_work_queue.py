@@ -0,0 +1,177 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import job_spool
+import work_queue
+
+LEASE = 1.0
+ITEMS = [{"id": f"2026-02-0{day}-{n}", "date": f"2026-02-0{day}"} for day in (4, 5) for n in range(3)]
+
+
+# ---------------------------------------------------------
+# Worker process: claim, heartbeat and complete until the
+# queue drains; optionally die holding a lease
+# ---------------------------------------------------------
+def _worker(name, done, crash_on=None):
+    while True:
+        job = work_queue.claim(name, lease=LEASE)
+        if job is None:
+            if work_queue.active_jobs() == 0:
+                return
+            time.sleep(0.05)
+            continue
+
+        if job["stage"] == crash_on:
+            # Flush what was reported so far, then die without cleanup
+            done.close()
+            done.join_thread()
+            os._exit(1)
+
+        time.sleep(0.05)
+        if not work_queue.heartbeat(job, LEASE):
+            continue
+        video_id = f"yt-{job['item_id']}" if job["stage"] == "upload" else None
+        if work_queue.complete(job, video_id):
+            done.put((job["item_id"], job["stage"], name))
+
+
+def _spender(units, limit, spent):
+    spent.put(work_queue.spend_quota("2026-02-04", units, limit))
+
+
+class WorkQueueProcessesTest(unittest.TestCase):
+    """
+    Several worker processes on one host sharing one queue file.
+    """
+    spool = False
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "work_queue.db")
+        # Spawned workers import work_queue afresh and read the paths here
+        self.env = {"WORK_QUEUE_PATH": self.path}
+        if self.spool:
+            self.env["JOB_SPOOL"] = os.path.join(self.root, "spool")
+        os.environ.update(self.env)
+        self.saved = (work_queue.WORK_QUEUE_PATH, job_spool.JOB_SPOOL)
+        work_queue.WORK_QUEUE_PATH = self.path
+        job_spool.JOB_SPOOL = self.env.get("JOB_SPOOL")
+        self.ctx = multiprocessing.get_context("spawn")
+
+    def tearDown(self):
+        work_queue.WORK_QUEUE_PATH, job_spool.JOB_SPOOL = self.saved
+        for key in self.env:
+            os.environ.pop(key, None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _attempts(self):
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute("SELECT SUM(attempts) FROM jobs").fetchone()[0]
+
+    def _run_workers(self, crash_on=(None, None, None)):
+        done = self.ctx.Queue()
+        procs = [
+            self.ctx.Process(target=_worker, args=(f"w{i}", done, crash))
+            for i, crash in enumerate(crash_on)
+        ]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join(60)
+            self.assertFalse(proc.is_alive())
+
+        finished = []
+        while len(finished) < len(ITEMS) * len(work_queue.STAGES):
+            finished.append(done.get(timeout=10))
+        return procs, finished
+
+    def test_workers_complete_every_job_once(self):
+        work_queue.enqueue(ITEMS)
+        self.assertEqual(work_queue.submit_jobs(), len(ITEMS))
+
+        _, finished = self._run_workers()
+
+        jobs = [(item_id, stage) for item_id, stage, _ in finished]
+        self.assertEqual(len(jobs), len(set(jobs)))
+        self.assertEqual(set(jobs), {(i["id"], s) for i in ITEMS for s in work_queue.STAGES})
+        self.assertEqual(work_queue.submit_jobs(), 0)
+        self.assertEqual(work_queue.counts(), {"done": len(ITEMS)})
+        self.assertEqual(work_queue.active_jobs(), 0)
+
+    def test_crashed_worker_lease_expires(self):
+        work_queue.enqueue(ITEMS)
+        work_queue.submit_jobs()
+
+        procs, finished = self._run_workers(crash_on=("render", None, None))
+
+        self.assertEqual(procs[0].exitcode, 1)
+        self.assertNotIn(("render", "w0"), {(stage, name) for _, stage, name in finished})
+        self.assertEqual(work_queue.submit_jobs(), 0)
+        self.assertEqual(work_queue.counts(), {"done": len(ITEMS)})
+        # The job w0 died on was retried after its lease ran out, as one attempt
+        self.assertEqual(self._attempts(), 1)
+
+    def test_expired_lease_goes_to_the_next_worker(self):
+        work_queue.enqueue(ITEMS[:1])
+        work_queue.submit_jobs()
+
+        first = work_queue.claim("slow", lease=0.2)
+        time.sleep(0.3)
+        second = work_queue.claim("fast", lease=LEASE)
+
+        self.assertEqual((second["item_id"], second["stage"]), (first["item_id"], first["stage"]))
+        self.assertFalse(work_queue.heartbeat(first, LEASE))
+        self.assertFalse(work_queue.complete(first))
+        self.assertTrue(work_queue.heartbeat(second, LEASE))
+        self.assertTrue(work_queue.complete(second))
+
+    def test_requeued_item_is_claimed_again(self):
+        work_queue.enqueue(ITEMS[:1])
+        work_queue.submit_jobs()
+
+        job = work_queue.claim("w", lease=LEASE, max_attempts=1)
+        work_queue.fail(job, "boom", max_attempts=1)
+        self.assertEqual(work_queue.submit_jobs(), 0)
+        self.assertEqual(work_queue.counts(), {"failed": 1})
+        self.assertIsNone(work_queue.claim("w", lease=LEASE))
+
+        self.assertEqual(work_queue.requeue(), 1)
+        again = work_queue.claim("w", lease=LEASE)
+        self.assertEqual((again["item_id"], again["stage"]), (job["item_id"], job["stage"]))
+
+    def test_quota_is_shared_by_processes(self):
+        spent = self.ctx.Queue()
+        procs = [self.ctx.Process(target=_spender, args=(1600, 5000, spent)) for _ in range(6)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join(60)
+
+        granted = sum(spent.get(timeout=10) for _ in procs)
+        # Never overdrawn; concurrent spenders may both back off on the spool
+        self.assertLessEqual(work_queue.quota_spent("2026-02-04"), 5000)
+        self.assertEqual(work_queue.quota_spent("2026-02-04"), granted * 1600)
+        self.assertGreaterEqual(granted, 1 if self.spool else 3)
+
+        work_queue.exhaust_quota("2026-02-04", 5000)
+        self.assertFalse(work_queue.spend_quota("2026-02-04", 50, 5000))
+
+
+class JobSpoolProcessesTest(WorkQueueProcessesTest):
+    """
+    The same, with jobs and quota as files in a spool folder (JOB_SPOOL),
+    as for workers on several hosts.
+    """
+    spool = True
+
+    def _attempts(self):
+        return sum(job["attempts"] for state, job in job_spool.outcomes() if state == "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import job_spool
+import work_queue
+import worker
+from helper import Stopped, gather_all, run_in_thread
+from media_runner import run_media
+
+ITEM = {"id": "2026-02-04-0", "date": "2026-02-04"}
+LEASE = 0.3
+# Writes its PID, then sleeps: stands in for a long ffmpeg
+SLEEPER = "import os, sys, time; open(sys.argv[1], 'w').write(str(os.getpid())); time.sleep(60)"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class LeaseLostTest(unittest.TestCase):
+    """
+    A worker whose lease is taken over stops the job's transfer thread
+    and kills its ffmpeg before it claims anything else.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.pid_file = os.path.join(self.root, "pid")
+        self.saved = (work_queue.WORK_QUEUE_PATH, job_spool.JOB_SPOOL)
+        work_queue.WORK_QUEUE_PATH = os.path.join(self.root, "work_queue.db")
+        job_spool.JOB_SPOOL = None
+        self.events = []
+
+    def tearDown(self):
+        work_queue.WORK_QUEUE_PATH, job_spool.JOB_SPOOL = self.saved
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _transfer(self, stop):
+        # An upload checks between chunks (see yt_schedule.resumable_upload);
+        # the chunk in flight still takes a moment to finish
+        while not stop.wait(0.01):
+            pass
+        time.sleep(0.2)
+        self.events.append("transfer stopped")
+        raise Stopped("transfer stopped")
+
+    async def _run_job(self, job, manifest, get_uploader, threads):
+        self.events.append(job["stage"])
+        if job["stage"] != "prepare":
+            with open(self.pid_file, encoding="utf-8") as f:
+                if _alive(int(f.read())):
+                    self.events.append("ffmpeg still running")
+            return None
+        self.job = job
+        # Like a render: ffmpeg and a thread at once (see final_videos)
+        await gather_all(
+            run_in_thread(self._transfer),
+            run_media([sys.executable, "-c", SLEEPER, self.pid_file], timeout=60)
+        )
+
+    async def _steal_lease(self):
+        while not (hasattr(self, "job") and os.path.exists(self.pid_file)):
+            await asyncio.sleep(0.01)
+        # Expire the worker's lease; another worker takes the job over and
+        # finishes it, so the next stage is ready at once
+        work_queue.heartbeat(self.job, -1)
+        thief = work_queue.claim("thief", lease=30)
+        self.assertEqual(thief["stage"], "prepare")
+        self.assertTrue(work_queue.complete(thief))
+
+    async def _main(self):
+        thief = asyncio.ensure_future(self._steal_lease())
+        await asyncio.wait_for(
+            worker.worker_main("w", work_queue.STAGES, LEASE, 1, exit_when_idle=True), 30
+        )
+        await thief
+
+    def test_lost_lease_stops_thread_and_kills_ffmpeg(self):
+        work_queue.enqueue([ITEM])
+        work_queue.submit_jobs()
+
+        with mock.patch.object(worker, "run_job", self._run_job), \
+                mock.patch.object(worker, "RunManifest", lambda: None), \
+                mock.patch.object(worker, "POLL_INTERVAL", 0.05):
+            asyncio.run(self._main())
+
+        # The next job only started once the lost one had fully stopped
+        self.assertEqual(self.events, ["prepare", "transfer stopped", "render", "upload"])
+        with open(self.pid_file, encoding="utf-8") as f:
+            self.assertFalse(_alive(int(f.read())))
+        self.assertEqual(work_queue.counts(), {"done": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
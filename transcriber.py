@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+# Backends:
+#   "whisper" → openai-whisper, full precision (default)
+#   "int8"    → faster-whisper (CTranslate2) with int8 weights on CPU
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "whisper")
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# Model registry: every (model, backend) pair is loaded once
+# ---------------------------------------------------------
+def load_model(name=WHISPER_MODEL, backend=WHISPER_BACKEND):
+    key = (name, backend)
+
+    with _models_lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        print(f"🧠 Loading Whisper model: {name} ({backend})")
+
+        # Imported here: torch costs seconds, and only transcription needs it
+        if backend == "whisper":
+            import whisper
+            model = whisper.load_model(name)
+        elif backend == "int8":
+            try:
+                from faster_whisper import WhisperModel
+            except ImportError as e:
+                raise RuntimeError(
+                    "WHISPER_BACKEND=int8 needs the faster-whisper package"
+                ) from e
+            model = WhisperModel(name, device="cpu", compute_type="int8")
+        else:
+            raise ValueError(f"Unknown Whisper backend: {backend}")
+
+        _models[key] = model
+        return model
+
+
+# ---------------------------------------------------------
+# Transcribe → flat list of {"word", "start", "end"}
+# ---------------------------------------------------------
+def transcribe_words(
+    audio_path,
+    whisper_model=WHISPER_MODEL,
+    backend=WHISPER_BACKEND,
+    language="en"
+):
+    model = load_model(whisper_model, backend)
+
+    print(f"🎙️ Transcribing {audio_path}...")
+
+    if backend == "int8":
+        segments, _ = model.transcribe(
+            audio_path,
+            word_timestamps=True,
+            language=language
+        )
+        return [
+            {"word": w.word, "start": w.start, "end": w.end}
+            for seg in segments
+            for w in (seg.words or [])
+        ]
+
+    result = model.transcribe(
+        audio_path,
+        word_timestamps=True,
+        language=language
+    )
+    return [
+        {"word": w["word"], "start": w["start"], "end": w["end"]}
+        for seg in result.get("segments", [])
+        for w in seg.get("words", [])
+    ]
+
+
+# ---------------------------------------------------------
+# Warm worker: one background thread that owns the model
+# and transcribes jobs while ffmpeg runs in the foreground
+# ---------------------------------------------------------
+class TranscriptionWorker:
+    def __init__(self, whisper_model=WHISPER_MODEL, backend=WHISPER_BACKEND):
+        self.whisper_model = whisper_model
+        self.backend = backend
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._loop,
+            name="transcription-worker",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+
+            future, audio_path, language = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                words = transcribe_words(
+                    audio_path,
+                    self.whisper_model,
+                    self.backend,
+                    language
+                )
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(words)
+
+    def submit(self, audio_path, language="en") -> Future:
+        """
+        Queue an audio file; the returned future resolves to its word timestamps.
+        """
+        future = Future()
+        self._jobs.put((future, audio_path, language))
+        return future
+
+    def close(self):
+        self._jobs.put(None)
+        self._thread.join()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker(whisper_model=WHISPER_MODEL, backend=WHISPER_BACKEND):
+    """
+    Shared worker for the whole run, so the model is loaded at most once.
+    """
+    global _worker
+
+    with _worker_lock:
+        if (
+            _worker is None
+            or _worker.whisper_model != whisper_model
+            or _worker.backend != backend
+        ):
+            _worker = TranscriptionWorker(whisper_model, backend)
+        return _worker
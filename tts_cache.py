@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from helper import CACHE_DIR, file_sha256, link_into
+from transcriber import WHISPER_BACKEND, WHISPER_MODEL
+
+# Synthesized audio + word timings (edge-tts and Whisper), keyed by the
+# normalized script, voice and chunk size rather than the CSV row index.
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(CACHE_DIR, "tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# Utility: index connection (one per call, thread safe)
+# ---------------------------------------------------------
+@contextmanager
+def _connect():
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(TTS_CACHE_DIR, "index.db"), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS entries (
+            key        TEXT PRIMARY KEY,
+            audio_sha  TEXT NOT NULL,
+            size       INTEGER NOT NULL,
+            last_used  REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS entries_audio ON entries (audio_sha);
+        CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+    """)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def normalize_text(text: str) -> str:
+    # Same cleaning generate_audio applies before synthesis
+    text = text.replace("``", '"').replace("''", '"')
+    return " ".join(text.split())
+
+
+def cache_key(text, voice, chunk_size) -> str:
+    payload = json.dumps([normalize_text(text), voice, chunk_size])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_dir(key):
+    return os.path.join(TTS_CACHE_DIR, key[:2], key)
+
+
+def _dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(path, f))
+        for f in os.listdir(path)
+    )
+
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------
+# Public API: synthesized audio + edge-tts word timings
+# ---------------------------------------------------------
+def get_audio(key, output_file):
+    """
+    On a hit, hard-link the cached audio to `output_file` and return its
+    word timings; otherwise return None.
+    """
+    entry = _entry_dir(key)
+    audio = os.path.join(entry, "audio.mp3")
+
+    with _lock, _connect() as conn:
+        row = conn.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        if not os.path.exists(audio) or file_sha256(audio) != row["audio_sha"]:
+            print(f"⚠️ Dropping corrupt TTS cache entry {key[:12]}")
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+
+    link_into(audio, output_file)
+    return _read_json(os.path.join(entry, "words.json"))
+
+
+def put_audio(key, audio_path, words):
+    """
+    Cache narration and its word timings under `key`, then evict least
+    recently used entries beyond TTS_CACHE_MAX_BYTES. Audio larger than
+    the whole budget is never cached.
+    """
+    size = os.path.getsize(audio_path)
+    if size > TTS_CACHE_MAX_BYTES:
+        print(f"⚠️ Not caching {audio_path}: {size} bytes is over the cache budget")
+        return
+
+    entry = _entry_dir(key)
+    os.makedirs(entry, exist_ok=True)
+
+    link_into(audio_path, os.path.join(entry, "audio.mp3"))
+    _write_json(os.path.join(entry, "words.json"), words)
+
+    with _lock, _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+            (key, file_sha256(audio_path), _dir_size(entry), time.time())
+        )
+        _evict(conn, keep=key)
+
+
+# ---------------------------------------------------------
+# Public API: Whisper transcripts, looked up by audio hash
+# and labelled with the model and backend that produced them
+# ---------------------------------------------------------
+def _transcript_file(key, whisper_model, backend):
+    return os.path.join(_entry_dir(key), f"whisper_{backend}_{whisper_model}.json")
+
+
+def get_transcript(audio_path, whisper_model=WHISPER_MODEL, backend=WHISPER_BACKEND):
+    audio_sha = file_sha256(audio_path)
+
+    with _lock, _connect() as conn:
+        row = conn.execute(
+            "SELECT key FROM entries WHERE audio_sha = ?", (audio_sha,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), row["key"])
+        )
+
+    path = _transcript_file(row["key"], whisper_model, backend)
+    return _read_json(path) if os.path.exists(path) else None
+
+
+def put_transcript(audio_path, words, whisper_model=WHISPER_MODEL, backend=WHISPER_BACKEND):
+    """
+    Attach a Whisper transcript to the entry holding this audio, if any.
+    """
+    audio_sha = file_sha256(audio_path)
+
+    with _lock, _connect() as conn:
+        row = conn.execute(
+            "SELECT key FROM entries WHERE audio_sha = ?", (audio_sha,)
+        ).fetchone()
+        if row is None:
+            return
+
+        entry = _entry_dir(row["key"])
+        _write_json(_transcript_file(row["key"], whisper_model, backend), words)
+        conn.execute(
+            "UPDATE entries SET size = ? WHERE key = ?", (_dir_size(entry), row["key"])
+        )
+        _evict(conn, keep=row["key"])
+
+
+def _evict(conn, keep=None):
+    """
+    Drop least recently used entries until the cache fits the budget;
+    `keep` (the entry just written) is never evicted.
+    """
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    if total <= TTS_CACHE_MAX_BYTES:
+        return
+
+    for row in conn.execute("SELECT * FROM entries ORDER BY last_used").fetchall():
+        if total <= TTS_CACHE_MAX_BYTES:
+            break
+        if row["key"] == keep:
+            continue
+        conn.execute("DELETE FROM entries WHERE key = ?", (row["key"],))
+        shutil.rmtree(_entry_dir(row["key"]), ignore_errors=True)
+        total -= row["size"]
+        print(f"🧹 Evicted cached TTS entry {row['key'][:12]}")
@@ -0,0 +1,122 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+import work_queue
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:  # no tz database (e.g. Windows without tzdata)
+    QUOTA_TZ = timezone(timedelta(hours=-8))
+
+# YouTube Data API cost per call, against the project's daily quota
+QUOTA_COSTS = {
+    "videos.insert": 1600,
+    "thumbnails.set": 50,
+}
+# What one short costs: the upload plus its custom thumbnail
+UPLOAD_OPERATIONS = ("videos.insert", "thumbnails.set")
+QUOTA_LIMIT = int(os.getenv("YT_QUOTA_LIMIT", "10000"))
+# HTTP 403 reasons YouTube gives once the day's quota (or upload cap) is used
+QUOTA_REASONS = ("quotaExceeded", "uploadLimitExceeded")
+
+
+# Not a failure: the item waits for tomorrow's quota (see work_queue.mark_deferred)
+class QuotaExceeded(RuntimeError):
+    pass
+
+
+def quota_day():
+    # YouTube resets the quota at midnight Pacific time
+    return datetime.now(QUOTA_TZ).date().isoformat()
+
+
+class QuotaTracker:
+    """
+    Units spent today, counted in the work queue so every process and run
+    draws on one budget. A call that would go over `limit` is refused up
+    front instead of failing after the bytes were sent.
+    """
+
+    def __init__(self, limit=QUOTA_LIMIT):
+        self.limit = limit
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    @property
+    def spent(self):
+        return work_queue.quota_spent(quota_day())
+
+    def spend(self, operation):
+        cost = QUOTA_COSTS[operation]
+        if not work_queue.spend_quota(quota_day(), cost, self.limit):
+            raise QuotaExceeded(
+                f"{operation} needs {cost} units, {max(0, self.limit - self.spent)} left today"
+            )
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def exhaust(self):
+        """
+        YouTube refused a call for quota (our count was behind, e.g. other
+        uploads on the project): nothing more today, for any process.
+        """
+        work_queue.exhaust_quota(quota_day(), self.limit)
+
+    def affordable(self, *operations) -> int:
+        """
+        How many more times `operations` (default: one whole upload) fit
+        in the units left.
+        """
+        cost = sum(QUOTA_COSTS[op] for op in operations or UPLOAD_OPERATIONS)
+        return max(0, self.limit - self.spent) // cost
+
+    def summary(self):
+        with self.lock:
+            calls = ", ".join(f"{op} ×{n}" for op, n in self.calls.items()) or "no calls"
+        return f"{self.spent}/{self.limit} quota units today ({calls} by this process)"
+
+
+class UploadEngine:
+    """
+    Thread-safe uploads: one set of credentials, one YouTube service (and
+    HTTP transport) per thread, chunked resumable transfers with retries
+    (see yt_schedule.resumable_upload). How many run at once is up to the
+    caller (pipeline upload workers).
+    """
+
+    def __init__(self, creds=None, quota=None):
+        # googleapiclient loads only once an upload actually starts
+        from yt_schedule import get_credentials
+
+        self.creds = creds or get_credentials()
+        self.quota = quota or QuotaTracker()
+        self.local = threading.local()
+
+    def service(self):
+        if not hasattr(self.local, "yt"):
+            from yt_schedule import get_authenticated_service
+            self.local.yt = get_authenticated_service(self.creds)
+        return self.local.yt
+
+    def upload(self, file_path, title, description="", tags=None, publish_at=None, **options):
+        from yt_schedule import upload_video_to_yt
+
+        self.quota.spend("videos.insert")
+        try:
+            return upload_video_to_yt(
+                self.service(), file_path, title, description, tags, publish_at, **options
+            )
+        except QuotaExceeded:
+            self.quota.exhaust()
+            raise
+
+    def set_thumbnail(self, video_id, thumbnail_path):
+        from yt_schedule import set_thumbnail
+
+        self.quota.spend("thumbnails.set")
+        try:
+            return set_thumbnail(self.service(), video_id, thumbnail_path)
+        except QuotaExceeded:
+            self.quota.exhaust()
+            raise
@@ -0,0 +1,439 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import job_spool
+
+# Items still to be produced, across runs: a batch run enqueues a date
+# range and works through whatever is not uploaded yet, earliest first.
+# In distributed mode each item's stages become jobs that workers lease.
+# This file belongs on a local disk (WAL keeps its index in shared memory,
+# SQLite locking is unreliable on NFS/SMB): workers on other hosts need
+# JOB_SPOOL, a folder they all mount, which then holds the stage jobs and
+# the quota count (see job_spool), while the items stay here with the
+# coordinator, collected from the spool by submit_jobs().
+WORK_QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", "work_queue.db")
+MAX_ATTEMPTS = int(os.getenv("WORK_MAX_ATTEMPTS", "3"))
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+STAGES = ("prepare", "render", "upload")
+
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# Utility: queue connection (one per call, thread safe)
+# ---------------------------------------------------------
+@contextmanager
+def _connect():
+    dirname = os.path.dirname(WORK_QUEUE_PATH)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    conn = sqlite3.connect(WORK_QUEUE_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS work (
+            item_id     TEXT PRIMARY KEY,
+            date        TEXT NOT NULL,
+            position    INTEGER NOT NULL,
+            status      TEXT NOT NULL DEFAULT 'pending',
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            stage       TEXT,
+            error       TEXT,
+            video_id    TEXT,
+            updated_at  REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS work_pending ON work (status, date, position);
+        CREATE TABLE IF NOT EXISTS jobs (
+            item_id     TEXT NOT NULL,
+            stage       TEXT NOT NULL,
+            rank        INTEGER NOT NULL,
+            status      TEXT NOT NULL DEFAULT 'ready',
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            worker      TEXT,
+            token       TEXT,
+            lease_until REAL,
+            error       TEXT,
+            PRIMARY KEY (item_id, stage)
+        );
+        CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, rank);
+        CREATE TABLE IF NOT EXISTS quota (
+            day     TEXT PRIMARY KEY,
+            spent   INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+def enqueue(items) -> int:
+    """
+    Add content items (dicts with "id" and "date", in CSV order); already
+    queued ones keep their state. Returns how many were new.
+    """
+    now = time.time()
+    with _lock, _connect() as conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO work (item_id, date, position, updated_at) VALUES (?, ?, ?, ?)",
+            [(item["id"], item["date"], i, now) for i, item in enumerate(items)]
+        )
+        return conn.total_changes - before
+
+
+def pending(limit=None, max_attempts=MAX_ATTEMPTS) -> list:
+    """
+    IDs still to produce, earliest publish date first; items that failed
+    `max_attempts` times stay out until requeued.
+    """
+    with _lock, _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT item_id FROM work
+            WHERE status != 'done' AND attempts < ?
+            ORDER BY date, position
+            LIMIT ?
+            """,
+            (max_attempts, -1 if limit is None else limit)
+        ).fetchall()
+    return [row["item_id"] for row in rows]
+
+
+def mark_done(item_id, video_id=None):
+    with _lock, _connect() as conn:
+        conn.execute(
+            "UPDATE work SET status = 'done', video_id = ?, error = NULL, updated_at = ? WHERE item_id = ?",
+            (video_id, time.time(), item_id)
+        )
+
+
+def mark_failed(item_id, stage, error):
+    with _lock, _connect() as conn:
+        conn.execute(
+            """
+            UPDATE work SET status = 'failed', attempts = attempts + 1,
+                            stage = ?, error = ?, updated_at = ?
+            WHERE item_id = ?
+            """,
+            (stage, error, time.time(), item_id)
+        )
+
+
+def mark_deferred(item_id, stage, reason):
+    """
+    Put an item off to a later run without counting an attempt
+    (e.g. the day's YouTube quota is spent).
+    """
+    with _lock, _connect() as conn:
+        conn.execute(
+            "UPDATE work SET status = 'deferred', stage = ?, error = ?, updated_at = ? "
+            "WHERE item_id = ? AND status != 'done'",
+            (stage, reason, time.time(), item_id)
+        )
+
+
+def requeue(item_id=None) -> int:
+    """
+    Give failed items (one, or all) a fresh set of attempts; in distributed
+    mode their failed job is made ready again. Returns how many.
+    """
+    with _lock, _connect() as conn:
+        if job_spool.JOB_SPOOL:
+            _collect_spooled(conn)
+            job_spool.requeue(item_id)
+        conn.execute(
+            "UPDATE jobs SET status = 'ready', attempts = 0, error = NULL "
+            "WHERE status = 'failed' AND item_id IN ("
+            "    SELECT item_id FROM work WHERE status = 'failed' AND (? IS NULL OR item_id = ?))",
+            (item_id, item_id)
+        )
+        return conn.execute(
+            "UPDATE work SET status = 'pending', attempts = 0, updated_at = ? "
+            "WHERE status = 'failed' AND (? IS NULL OR item_id = ?)",
+            (time.time(), item_id, item_id)
+        ).rowcount
+
+
+def counts() -> dict:
+    with _lock, _connect() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) AS n FROM work GROUP BY status").fetchall()
+    return {row["status"]: row["n"] for row in rows}
+
+
+# ---------------------------------------------------------
+# Distributed mode: stage jobs leased by workers
+# ---------------------------------------------------------
+def _add_job(conn, item_id, stage):
+    conn.execute(
+        "INSERT OR IGNORE INTO jobs (item_id, stage, rank) VALUES (?, ?, ?)",
+        (item_id, stage, STAGES.index(stage))
+    )
+
+
+def _collect_spooled(conn):
+    # What spooled jobs came to, into the items: uploads done, items failed
+    # or deferred
+    for state, job in job_spool.outcomes():
+        if state == "done" and job["stage"] == STAGES[-1]:
+            conn.execute(
+                "UPDATE work SET status = 'done', video_id = ?, error = NULL, updated_at = ? "
+                "WHERE item_id = ? AND status != 'done'",
+                (job.get("video_id"), time.time(), job["item_id"])
+            )
+        elif state == "failed":
+            conn.execute(
+                "UPDATE work SET status = 'failed', attempts = ?, stage = ?, error = ?, updated_at = ? "
+                "WHERE item_id = ? AND status != 'failed'",
+                (MAX_ATTEMPTS, job["stage"], job.get("error"), time.time(), job["item_id"])
+            )
+        elif state == "deferred":
+            conn.execute(
+                "UPDATE work SET status = 'deferred', stage = ?, error = ?, updated_at = ? "
+                "WHERE item_id = ?",
+                (job["stage"], job.get("reason"), time.time(), job["item_id"])
+            )
+
+
+def submit_jobs(max_attempts=MAX_ATTEMPTS) -> int:
+    """
+    Give every pending item without jobs its first stage job, and release
+    jobs deferred by an earlier run. Returns how many items were submitted.
+    With JOB_SPOOL, first collects what the spooled jobs came to.
+    """
+    with _lock, _connect() as conn:
+        if job_spool.JOB_SPOOL:
+            _collect_spooled(conn)
+            released = job_spool.release_deferred()
+            submitted = job_spool.item_ids()
+        else:
+            released = conn.execute(
+                "UPDATE jobs SET status = 'ready' WHERE status = 'deferred'"
+            ).rowcount
+            submitted = {row["item_id"] for row in conn.execute("SELECT DISTINCT item_id FROM jobs")}
+        rows = [
+            row for row in conn.execute(
+                "SELECT item_id, date, position FROM work WHERE status != 'done' AND attempts < ?",
+                (max_attempts,)
+            ).fetchall()
+            if row["item_id"] not in submitted
+        ]
+        for row in rows:
+            if job_spool.JOB_SPOOL:
+                job_spool.add_job(row["item_id"], row["date"], row["position"], STAGES[0], 0)
+            else:
+                _add_job(conn, row["item_id"], STAGES[0])
+    return len(rows) + released
+
+
+def _reclaim_expired(conn, now, max_attempts):
+    # A worker that stopped heartbeating lost its job; crashes count as attempts
+    conn.execute(
+        """
+        UPDATE jobs SET status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'ready' END,
+                        attempts = attempts + 1, worker = NULL, token = NULL,
+                        error = 'lease expired'
+        WHERE status = 'leased' AND lease_until < ?
+        """,
+        (max_attempts, now)
+    )
+
+
+def claim(worker, stages=STAGES, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """
+    Lease the next ready job for `worker`: later stages first (finish what
+    is in flight), then earliest date. Returns
+    {"item_id", "stage", "token"} or None when nothing is ready.
+    """
+    if job_spool.JOB_SPOOL:
+        return job_spool.claim(stages, lease, max_attempts)
+
+    token = uuid.uuid4().hex
+    now = time.time()
+    marks = ",".join("?" for _ in stages)
+
+    with _lock, _connect() as conn:
+        _reclaim_expired(conn, now, max_attempts)
+        # One statement, so two workers can never take the same job
+        conn.execute(
+            f"""
+            UPDATE jobs SET status = 'leased', worker = ?, token = ?, lease_until = ?
+            WHERE rowid = (
+                SELECT jobs.rowid FROM jobs JOIN work USING (item_id)
+                WHERE jobs.status = 'ready' AND jobs.stage IN ({marks})
+                ORDER BY jobs.rank DESC, work.date, work.position
+                LIMIT 1
+            )
+            """,
+            (worker, token, now + lease, *stages)
+        )
+        row = conn.execute(
+            "SELECT item_id, stage, token FROM jobs WHERE token = ?", (token,)
+        ).fetchone()
+
+    return dict(row) if row else None
+
+
+def heartbeat(job, lease=LEASE_SECONDS) -> bool:
+    """
+    Extend a lease; False once it was lost (expired and reclaimed).
+    """
+    if job_spool.JOB_SPOOL:
+        return job_spool.heartbeat(job, lease)
+    with _lock, _connect() as conn:
+        cur = conn.execute(
+            "UPDATE jobs SET lease_until = ? WHERE token = ? AND status = 'leased'",
+            (time.time() + lease, job["token"])
+        )
+        return cur.rowcount == 1
+
+
+def complete(job, video_id=None) -> bool:
+    """
+    Finish a leased job and release the item's next stage.
+    """
+    rank = STAGES.index(job["stage"])
+    if job_spool.JOB_SPOOL:
+        if not job_spool.complete(job, video_id):
+            return False
+        if rank + 1 < len(STAGES):
+            job_spool.add_job(job["item_id"], job["date"], job["position"], STAGES[rank + 1], rank + 1)
+        return True
+
+    with _lock, _connect() as conn:
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'done', token = NULL, error = NULL "
+            "WHERE token = ? AND status = 'leased'",
+            (job["token"],)
+        )
+        if cur.rowcount != 1:
+            return False
+
+        if rank + 1 < len(STAGES):
+            _add_job(conn, job["item_id"], STAGES[rank + 1])
+        else:
+            conn.execute(
+                "UPDATE work SET status = 'done', video_id = ?, error = NULL, updated_at = ? "
+                "WHERE item_id = ?",
+                (video_id, time.time(), job["item_id"])
+            )
+        return True
+
+
+def fail(job, error, max_attempts=MAX_ATTEMPTS):
+    """
+    Put a failed job back for another worker, or give up on the item
+    after `max_attempts`.
+    """
+    if job_spool.JOB_SPOOL:
+        return job_spool.fail(job, error, max_attempts)
+    with _lock, _connect() as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'ready' END,
+                            attempts = attempts + 1, worker = NULL, token = NULL, error = ?
+            WHERE token = ? AND status = 'leased'
+            """,
+            (max_attempts, error, job["token"])
+        )
+        conn.execute(
+            """
+            UPDATE work SET status = 'failed', attempts = ?, stage = ?, error = ?, updated_at = ?
+            WHERE item_id = ? AND EXISTS (
+                SELECT 1 FROM jobs WHERE item_id = ? AND stage = ? AND status = 'failed'
+            )
+            """,
+            (max_attempts, job["stage"], error, time.time(),
+             job["item_id"], job["item_id"], job["stage"])
+        )
+
+
+def defer(job, reason):
+    """
+    Park a leased job, without an attempt, until the next submit_jobs().
+    """
+    if job_spool.JOB_SPOOL:
+        return job_spool.defer(job, reason)
+    with _lock, _connect() as conn:
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'deferred', worker = NULL, token = NULL, error = ? "
+            "WHERE token = ? AND status = 'leased'",
+            (reason, job["token"])
+        )
+        if cur.rowcount == 1:
+            conn.execute(
+                "UPDATE work SET status = 'deferred', stage = ?, error = ?, updated_at = ? "
+                "WHERE item_id = ?",
+                (job["stage"], reason, time.time(), job["item_id"])
+            )
+
+
+def job_counts() -> dict:
+    if job_spool.JOB_SPOOL:
+        return job_spool.job_counts()
+    with _lock, _connect() as conn:
+        rows = conn.execute(
+            "SELECT stage, status, COUNT(*) AS n FROM jobs GROUP BY stage, status"
+        ).fetchall()
+    return {f"{row['stage']}:{row['status']}": row["n"] for row in rows}
+
+
+def active_jobs() -> int:
+    """
+    Jobs ready or leased: 0 means the queue has drained.
+    """
+    if job_spool.JOB_SPOOL:
+        return job_spool.active_jobs()
+    with _lock, _connect() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('ready', 'leased')"
+        ).fetchone()[0]
+
+
+# ---------------------------------------------------------
+# YouTube quota: units spent per quota day, one count for
+# every process and run using this queue (or JOB_SPOOL)
+# ---------------------------------------------------------
+def spend_quota(day, units, limit) -> bool:
+    """
+    Record `units` against `day` unless that would go over `limit`.
+    One conditional UPDATE, so concurrent spenders can never overdraw.
+    """
+    if job_spool.JOB_SPOOL:
+        return job_spool.spend_quota(day, units, limit)
+    with _lock, _connect() as conn:
+        conn.execute("INSERT OR IGNORE INTO quota (day) VALUES (?)", (day,))
+        cur = conn.execute(
+            "UPDATE quota SET spent = spent + ? WHERE day = ? AND spent + ? <= ?",
+            (units, day, units, limit)
+        )
+        return cur.rowcount == 1
+
+
+def exhaust_quota(day, limit):
+    """
+    YouTube refused a call for quota: count `day` as spent for everyone.
+    """
+    if job_spool.JOB_SPOOL:
+        return job_spool.exhaust_quota(day, limit)
+    with _lock, _connect() as conn:
+        conn.execute(
+            "INSERT INTO quota (day, spent) VALUES (?, ?) "
+            "ON CONFLICT (day) DO UPDATE SET spent = MAX(spent, excluded.spent)",
+            (day, limit)
+        )
+
+
+def quota_spent(day) -> int:
+    if job_spool.JOB_SPOOL:
+        return job_spool.quota_spent(day)
+    with _lock, _connect() as conn:
+        row = conn.execute("SELECT spent FROM quota WHERE day = ?", (day,)).fetchone()
+    return row["spent"] if row else 0
@@ -0,0 +1,151 @@
+import os
+import asyncio
+import argparse
+import socket
+import time
+import work_queue
+from content_store import get_item
+from helper import run_in_thread
+from manifest import RunManifest
+from render_scheduler import render_one, thread_budget
+from stages import cleanup_item, prepare_item, publish_times, record_render, render_job, upload_item
+from uploader import QuotaExceeded, UploadEngine
+
+# ---------------------------------------------------------
+# Distributed worker: lease stage jobs from the shared queue
+# (see work_queue), run them, publish the artifacts into the
+# shared root. Start any number on the coordinator's host; on
+# other hosts too once the root is a share they all mount,
+# JOB_SPOOL a folder in it (jobs and quota as files, see
+# job_spool) and CACHE_DIR a local folder on each host (SQLite
+# must not be shared over NFS/SMB):
+#   JOB_SPOOL=spool python main.py --coordinate --start 2026-02-04 --days 7
+#   JOB_SPOOL=spool CACHE_DIR=/var/cache/shorts python worker.py --root /mnt/shorts --stages render
+# ---------------------------------------------------------
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "5"))
+
+
+async def _keep_leased(job, lease, on_lost):
+    while True:
+        await asyncio.sleep(lease / 3)
+        if not await asyncio.to_thread(work_queue.heartbeat, job, lease):
+            print(f"⚠️ Lost lease on {job['stage']} {job['item_id']}")
+            on_lost()
+            return
+
+
+async def run_job(job, manifest, get_uploader, threads):
+    """
+    Run one stage of one item. Returns the YouTube video ID for uploads.
+    """
+    item = get_item(job["item_id"])
+    if item is None:
+        raise RuntimeError(f"Item {job['item_id']} is no longer in the content store")
+
+    if job["stage"] == "prepare":
+        await prepare_item(item, manifest, threads)
+
+    elif job["stage"] == "render":
+        if manifest.done(item["id"], "render"):
+            print(f"Render already done for ID {item['id']}")
+            return None
+        render = render_job(item["id"])
+        await render_one(render, threads)
+        record_render(manifest, render)
+
+    elif job["stage"] == "upload":
+        publish_at = publish_times([item])[item["id"]]
+        video_id = await run_in_thread(
+            upload_item, get_uploader(), item, manifest, publish_at
+        )
+        cleanup_item(item["id"])
+        return video_id
+
+    return None
+
+
+async def worker_main(worker_id, stages, lease, threads, exit_when_idle):
+    manifest = RunManifest()
+    uploader = []
+
+    # Render-only workers never need YouTube credentials
+    def get_uploader():
+        if not uploader:
+            uploader.append(UploadEngine())
+        return uploader[0]
+
+    print(f"👷 Worker {worker_id} ({', '.join(stages)}, {threads} threads) in {os.getcwd()}")
+
+    while True:
+        job = await asyncio.to_thread(work_queue.claim, worker_id, stages, lease)
+
+        if job is None:
+            if exit_when_idle and await asyncio.to_thread(work_queue.active_jobs) == 0:
+                print(f"✅ Worker {worker_id}: queue drained")
+                return
+            await asyncio.sleep(POLL_INTERVAL)
+            continue
+
+        print(f"🔧 {worker_id}: {job['stage']} {job['item_id']}")
+        start = time.monotonic()
+
+        task = asyncio.ensure_future(run_job(job, manifest, get_uploader, threads))
+        keeper = asyncio.ensure_future(_keep_leased(job, lease, task.cancel))
+
+        try:
+            video_id = await task
+        except asyncio.CancelledError:
+            if not keeper.done():
+                raise
+            # Lease lost: another worker owns the job now. The task only
+            # ends once its ffmpeg is killed (run_media) and its transfer
+            # thread has stopped (run_in_thread), so nothing of it is
+            # still running when the next job is claimed.
+            continue
+        except QuotaExceeded as e:
+            # Not an attempt: the upload waits for the next quota day, and
+            # this worker stops taking uploads it cannot send
+            print(f"⏸️ {worker_id}: quota spent, upload of {job['item_id']} deferred")
+            await asyncio.to_thread(work_queue.defer, job, str(e))
+            stages = tuple(s for s in stages if s != "upload")
+            if not stages:
+                return
+            continue
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"❌ {job['stage']} failed for ID {job['item_id']}: {error}")
+            await asyncio.to_thread(work_queue.fail, job, error)
+            continue
+        finally:
+            keeper.cancel()
+
+        await asyncio.to_thread(work_queue.complete, job, video_id)
+        print(f"✅ {job['stage']} {job['item_id']} in {time.monotonic() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run stage jobs from the shared work queue")
+    parser.add_argument("--root", default=".", help="Folder holding the queue and artifacts (shared by every host)")
+    parser.add_argument("--stages", default=",".join(work_queue.STAGES))
+    parser.add_argument("--id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--lease", type=float, default=None, help="Lease length in seconds")
+    parser.add_argument(
+        "--threads", type=int, default=None,
+        help="ffmpeg threads per job (default: this host's cores shared by RENDER_WORKERS workers)"
+    )
+    parser.add_argument("--exit-when-idle", action="store_true")
+    args = parser.parse_args()
+
+    # Queue, spool, manifest and work folders are all relative paths:
+    # moving into the shared root is what makes every worker see the same ones
+    os.chdir(args.root)
+
+    asyncio.run(worker_main(
+        args.id,
+        tuple(s.strip() for s in args.stages.split(",") if s.strip()),
+        args.lease or work_queue.LEASE_SECONDS,
+        # Each worker runs one job at a time: start RENDER_WORKERS of them
+        # per host and together they fill its cores, like main.py's pool
+        args.threads or thread_budget()[1],
+        args.exit_when_idle
+    ))
@@ -1,11 +1,20 @@
 import base64
+import json
 import os
 import pickle
+import random
+import threading
+import time
+import httplib2
+import google_auth_httplib2
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 from google_auth_oauthlib.flow import InstalledAppFlow
 from dotenv import load_dotenv
 import google.auth.transport.requests
+from helper import Stopped
+from uploader import QUOTA_REASONS, QuotaExceeded
 
 load_dotenv() 
 # Path to your OAuth client secrets JSON
@@ -23,7 +32,16 @@ SCOPES = [
     "https://www.googleapis.com/auth/youtube.upload",
     "https://www.googleapis.com/auth/youtube.force-ssl"
 ]
-def get_authenticated_service():
+
+# Resumable upload: chunk size must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_RETRIES = 10
+RETRIABLE_STATUS = (500, 502, 503, 504)
+# Socket resets and timeouts are OSErrors
+RETRIABLE_EXCEPTIONS = (httplib2.HttpLib2Error, OSError)
+
+
+def get_credentials():
     creds = None
     
     # 1️⃣ Try loading from file if exists
@@ -69,10 +87,82 @@ def get_authenticated_service():
         with open("token.pickle", "wb") as f:
             pickle.dump(creds, f)
 
-    # Build YouTube service
-    return build("youtube", "v3", credentials=creds)
+    return creds
+
+
+def get_authenticated_service(creds=None):
+    """
+    YouTube service on its own HTTP transport. httplib2 connections are not
+    thread-safe, so every concurrent uploader builds one from shared creds.
+    """
+    if creds is None:
+        creds = get_credentials()
+
+    http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+    return build("youtube", "v3", http=http, cache_discovery=False)
+
+
+# ---------------------------------------------------------
+# Utility: send a resumable upload chunk by chunk, retrying
+# transient failures from the last byte the server acknowledged
+# ---------------------------------------------------------
+def _quota_error(e):
+    """
+    QuotaExceeded for a 403 that only means "not today" (quota or upload
+    cap used up), so the item is deferred instead of failed; else None.
+    """
+    if e.resp.status != 403:
+        return None
+    try:
+        errors = json.loads(e.content.decode("utf-8"))["error"].get("errors", [])
+    except (ValueError, KeyError, AttributeError, TypeError):
+        return None
+    for error in errors:
+        if error.get("reason") in QUOTA_REASONS:
+            return QuotaExceeded(f"YouTube refused the call: {error['reason']}")
+    return None
+
+
+def resumable_upload(request, label="", stop=None):
+    stop = stop or threading.Event()
+    response = None
+    retry = 0
+    started = time.monotonic()
+
+    while response is None:
+        # Checked between chunks: a stopped upload sends nothing more
+        if stop.is_set():
+            raise Stopped(f"Upload {label} stopped")
+        try:
+            status, response = request.next_chunk()
+        except HttpError as e:
+            if e.resp.status not in RETRIABLE_STATUS:
+                raise _quota_error(e) or e
+            error = e
+        except RETRIABLE_EXCEPTIONS as e:
+            error = e
+        else:
+            retry = 0
+            if status:
+                sent = status.resumable_progress
+                rate = sent / max(time.monotonic() - started, 1e-6) / 1e6
+                print(f"Uploading {label}... {int(status.progress() * 100)}% ({rate:.1f} MB/s)")
+            continue
+
+        retry += 1
+        if retry > UPLOAD_RETRIES:
+            raise error
+
+        # The next call first asks the server how much it has, then
+        # continues from there
+        delay = min(2 ** retry, 64) * random.uniform(0.5, 1.0)
+        print(f"⚠️ Upload {label} interrupted ({error}); retry {retry}/{UPLOAD_RETRIES} in {delay:.1f}s")
+        stop.wait(delay)
+
+    return response
+
 
-def upload_video_to_yt(yt,file_path, title, description="", tags=None,  publish_at=None, category_id="27", privacy_status="private",made_for_kids=False):
+def upload_video_to_yt(yt,file_path, title, description="", tags=None,  publish_at=None, category_id="27", privacy_status="private",made_for_kids=False, stop=None):
     """
     Uploads a video to the YouTube channel associated with the OAuth credentials.
     """
@@ -92,7 +182,7 @@ def upload_video_to_yt(yt,file_path, title, description="", tags=None,  publish_
         }
     }
 
-    media = MediaFileUpload(file_path, chunksize=-1, resumable=True)
+    media = MediaFileUpload(file_path, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
 
     request = youtube.videos().insert(
         part="snippet,status",
@@ -100,28 +190,28 @@ def upload_video_to_yt(yt,file_path, title, description="", tags=None,  publish_
         media_body=media
     )
 
-    response = None
-    while response is None:
-        status, response = request.next_chunk()
-        if status:
-            print(f"Uploading... {int(status.progress() * 100)}%")
+    response = resumable_upload(request, os.path.basename(file_path), stop)
 
     print(f"\n✅ Video uploaded: https://www.youtube.com/watch?v={response['id']}")
     return response
 
 
+def set_thumbnail(yt, video_id, thumbnail_path):
     """
     Sets a custom thumbnail for the uploaded video.
     """
-    youtube = get_authenticated_service()
-    
-    media = MediaFileUpload(thumbnail_path)
-    
+    youtube = yt
+
+    media = MediaFileUpload(thumbnail_path, mimetype="image/jpeg")
+
     request = youtube.thumbnails().set(
         videoId=video_id,
         media_body=media
     )
     
-    response = request.execute()
+    try:
+        response = request.execute()
+    except HttpError as e:
+        raise _quota_error(e) or e
     print(f"✅ Thumbnail set for video {video_id}")
     return response
\ No newline at end of file